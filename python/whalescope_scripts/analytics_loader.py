@@ -14,6 +14,9 @@ import pandas as pd
 from datetime import datetime
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "marketbrain.db")
+# fetch_allium_data runs one staking_analysis per chain in parallel, and each
+# saves here; wait this long for another writer's lock instead of sqlite3's 5 s
+DB_TIMEOUT = 30
 
 # ============================================================
 # DB INIT
@@ -21,7 +24,7 @@ DB_PATH = os.path.join(os.path.dirname(__file__), "marketbrain.db")
 
 def init_db():
     """Create the tables in marketbrain.db if they don't already exist."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, timeout=DB_TIMEOUT)
     cur = conn.cursor()
 
     cur.executescript("""
@@ -69,7 +72,7 @@ def save_to_db(symbol: str, staking_table: list):
         return
 
     init_db()
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, timeout=DB_TIMEOUT)
     cur = conn.cursor()
 
     for row in staking_table:
@@ -125,7 +128,7 @@ def save_whale_signals(symbol: str, signals: list):
         return
 
     init_db()
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, timeout=DB_TIMEOUT)
     cur = conn.cursor()
 
     for s in signals:
@@ -12,6 +12,7 @@
 import sys
 import time
 import json
+import orjson
 import random
 import os
 import requests
@@ -433,4 +434,10 @@ if __name__ == "__main__":
     a = p.parse_args()
 
     result = fetch_binance_market(a.symbol, a.start_date, a.end_date)
-    print(json.dumps(result, indent=2))
\ No newline at end of file
+    # orjson encodes the numpy scalars in the result natively (NaN becomes null).
+    # Flush first so anything already printed stays ahead of the raw bytes
+    sys.stdout.flush()
+    sys.stdout.buffer.write(orjson.dumps(
+        result, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    ) + b"\n")
+    sys.stdout.flush()
\ No newline at end of file
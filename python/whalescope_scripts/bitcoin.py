@@ -339,15 +339,12 @@ def fetch_bitcoin_data(start_date=None, end_date=None):
     params = {"symbol": "BTCUSDT", "interval": "1d", "startTime": start_ts, "endTime": end_ts, "limit": 1000}
     historical_data = make_request_with_retry(url_klines, params=params) or []
 
-    price_history = {"dates": [], "open": [], "high": [], "low": [], "close": [], "volume": []}
-    for entry in historical_data:
-        date = datetime.utcfromtimestamp(entry[0] / 1000).strftime("%Y-%m-%d")
-        price_history["dates"].append(date)
-        price_history["open"].append(float(entry[1]))
-        price_history["high"].append(float(entry[2]))
-        price_history["low"].append(float(entry[3]))
-        price_history["close"].append(float(entry[4]))
-        price_history["volume"].append(float(entry[5]))
+    # One numeric conversion for the whole response: open time plus the five OHLCV columns
+    klines = np.array([e[:6] for e in historical_data], dtype=np.float64).reshape(-1, 6)
+    price_history = {
+        "dates": pd.to_datetime(klines[:, 0].astype(np.int64), unit="ms", utc=True).strftime("%Y-%m-%d").tolist(),
+        **dict(zip(("open", "high", "low", "close", "volume"), klines[:, 1:].T.tolist())),
+    }
 
     df = pd.DataFrame(price_history)
 
@@ -404,14 +401,15 @@ def fetch_bitcoin_data(start_date=None, end_date=None):
 
     # ----------------- Performance Metrics -----------------
     percent_change_7d, percent_change_30d = 0, 0
-    if len(df) >= 7:
+    close = df["close"].to_numpy() if "close" in df else []
+    if len(close) >= 7:
         try:
-            percent_change_7d = (df["close"].iloc[-1] - df["close"].iloc[-7]) / df["close"].iloc[-7] * 100
+            percent_change_7d = (close[-1] - close[-7]) / close[-7] * 100
         except Exception:
             pass
-    if len(df) >= 30:
+    if len(close) >= 30:
         try:
-            percent_change_30d = (df["close"].iloc[-1] - df["close"].iloc[-30]) / df["close"].iloc[-30] * 100
+            percent_change_30d = (close[-1] - close[-30]) / close[-30] * 100
         except Exception:
             pass
 
@@ -1,12 +1,24 @@
 import argparse
+import asyncio
 import json
 import logging
 import os
+import queue
+import re
 import sqlite3
 import sys
+import threading
 import time
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+import matplotlib
+matplotlib.use('Agg')  # headless rendering, plots are only saved to disk
 import matplotlib.pyplot as plt
+import aiohttp
+import numpy as np
+import orjson
+import pandas as pd
 import requests
 from appdirs import user_log_dir
 from dotenv import load_dotenv
@@ -14,6 +26,13 @@ from logging.handlers import RotatingFileHandler
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+from db_utils import open_db
+
+try:
+    import uvloop
+except ImportError:  # uvloop does not support Windows
+    uvloop = None
+
 # Suppress matplotlib font debugging logs
 logging.getLogger('matplotlib.font_manager').setLevel(logging.WARNING)
 
@@ -38,6 +57,7 @@ logger = logging.getLogger(__name__)
 DB_PATH = os.path.join(os.path.dirname(__file__), 'whalescope.db')
 ARKHAM_API_KEY = os.getenv("ARKHAM_API_KEY")
 PLOT_DIR = os.path.join(user_log_dir("WhaleScope", "Cauco"), "plots")
+PROGRESS_FILE = "blackrock_progress.jsonl"
 os.makedirs(PLOT_DIR, exist_ok=True)
 
 # FED news events
@@ -47,57 +67,160 @@ FED_EVENTS = [
     {"date": "2025-07-25", "event": "BlackRock's Rogal and Wolfe's Roth discuss FED rate cut expectations", "source": "web:0"},
 ]
 
+# Tokens tracked for holdings and historical balances
+TRACKED_TOKENS = ['BTC', 'ETH', 'USDC']
+
+# Prepared statements shared by the write paths
+SQL_INSERT_TX = '''
+    INSERT OR REPLACE INTO arkham_transactions (entity_id, date, type, amount, amount_usd, token)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+SQL_INSERT_WALLET = '''
+    INSERT OR REPLACE INTO arkham_wallets (entity_id, token, balance, balance_usd, timestamp)
+    VALUES (?, ?, ?, ?, ?)
+'''
+SQL_DELETE_WALLETS_RANGE = '''
+    DELETE FROM arkham_wallets
+    WHERE entity_id = ?
+    AND timestamp BETWEEN ? AND ?
+'''
+SQL_SELECT_CACHED_PRICES = '''
+    SELECT symbol, date, price FROM price_cache
+    WHERE date BETWEEN ? AND ?
+    AND (date < ? OR fetched_at > ?)
+'''
+SQL_INSERT_CACHED_PRICE = '''
+    INSERT OR REPLACE INTO price_cache (symbol, date, price, fetched_at)
+    VALUES (?, ?, ?, ?)
+'''
+
+# Prices for the current day are refreshed after this many seconds; past days are immutable
+PRICE_CACHE_TTL = 300
+
+SQL_SELECT_API_CACHE = 'SELECT blob FROM api_cache WHERE key = ? AND ts > ?'
+SQL_INSERT_API_CACHE = 'INSERT OR REPLACE INTO api_cache (key, ts, blob) VALUES (?, ?, ?)'
+
+# Arkham entity metadata rarely changes and its address set is stable for longer
+ENTITY_CACHE_TTL = 3600
+ADDRESS_CACHE_TTL = 86400
+
+# Rows buffered per executemany when streaming transactions
+TX_BATCH_SIZE = 1000
+
+# Max concurrent Arkham address history requests in the fallback path
+ADDRESS_FETCH_CONCURRENCY = 5
+# Keep-alive connections held open to Arkham
+HTTP_POOL_SIZE = 32
+# Threads for the Arkham calls main() runs alongside the database work
+PHASE_WORKERS = 4
+# Transfers the prefetch thread may run ahead of the consumer (three 100-row Arkham pages)
+PREFETCH_MAX_ITEMS = 300
+# Seconds a blocked prefetch put waits before checking whether the consumer is gone
+PREFETCH_POLL = 0.5
+
+# Arkham labels exchange wallets in the address string; match once per transfer without lowercasing
+EXCHANGE_RE = re.compile(r'exchange', re.IGNORECASE)
+
 # Fallback addresses (add known BlackRock addresses if available)
 FALLBACK_ADDRESSES = []  # Replace with actual addresses, e.g., ["0x_known_address_1", "0x_known_address_2"]
 
 def create_session():
-    """Create a requests session with retry configuration."""
+    """Create a pooled requests session with retry configuration."""
     session = requests.Session()
     retries = Retry(total=5, backoff_factor=2, status_forcelist=[429, 500, 502, 503, 504])
-    session.mount('https://', HTTPAdapter(max_retries=retries))
-    session.headers.update({"User-Agent": "WhaleScope/1.0 (BlackRockScript)"})
+    session.mount('https://', HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retries))
+    session.headers.update({"User-Agent": "WhaleScope/1.0 (BlackRockScript)", "Accept-Encoding": "gzip, deflate"})
     return session
 
+# One keep-alive session shared by every Arkham call, including executor threads
+SESSION = create_session()
+
 def save_intermediate_output(output_dir, data, filename):
     """Save intermediate JSON output."""
     os.makedirs(output_dir, exist_ok=True)
     output_file = os.path.join(output_dir, filename)
-    with open(output_file, 'w') as f:
-        json.dump(data, f, indent=2)
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
     logger.info(f"Intermediate data saved to {output_file}")
 
+def emit_section(output_dir, sections, reset=False):
+    """Append one JSONL record of newly computed output sections to the progress sidecar.
+
+    Merging the records in order with dict.update() rebuilds output_data as of
+    the last checkpoint, so a failed run can still be inspected.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    progress_file = os.path.join(output_dir, PROGRESS_FILE)
+    with open(progress_file, 'wb' if reset else 'ab') as f:
+        f.write(orjson.dumps(sections, option=orjson.OPT_NON_STR_KEYS) + b'\n')
+
+API_CACHE_DDL = '''CREATE TABLE IF NOT EXISTS api_cache (
+    key TEXT PRIMARY KEY, ts REAL NOT NULL, blob BLOB NOT NULL
+) WITHOUT ROWID'''
+
+# Both tables are keyed on their full composite PK, so rows live directly in the PK B-Tree
+ARKHAM_TRANSACTIONS_DDL = '''CREATE TABLE IF NOT EXISTS arkham_transactions (
+    entity_id TEXT NOT NULL, date TEXT NOT NULL, type TEXT NOT NULL, amount REAL NOT NULL, 
+    amount_usd REAL NOT NULL, token TEXT NOT NULL,
+    PRIMARY KEY (entity_id, date, type, token)
+) WITHOUT ROWID'''
+ARKHAM_WALLETS_DDL = '''CREATE TABLE IF NOT EXISTS arkham_wallets (
+    entity_id TEXT NOT NULL, token TEXT NOT NULL, balance REAL NOT NULL, balance_usd REAL NOT NULL, 
+    timestamp TEXT NOT NULL,
+    PRIMARY KEY (entity_id, token, timestamp)
+) WITHOUT ROWID'''
+PRICE_CACHE_DDL = '''CREATE TABLE IF NOT EXISTS price_cache (
+    symbol TEXT NOT NULL, date TEXT NOT NULL, price REAL NOT NULL, fetched_at REAL NOT NULL,
+    PRIMARY KEY (symbol, date)
+) WITHOUT ROWID'''
+
 def migrate_arkham_transactions(cursor):
     """Migrate arkham_transactions table to include 'token' column if missing."""
     logger.info("Migrating arkham_transactions table to include token column")
     cursor.execute("ALTER TABLE arkham_transactions RENAME TO arkham_transactions_old")
-    cursor.execute('''CREATE TABLE arkham_transactions (
-        entity_id TEXT, date TEXT NOT NULL, type TEXT NOT NULL, amount REAL NOT NULL, 
-        amount_usd REAL NOT NULL, token TEXT NOT NULL,
-        PRIMARY KEY (entity_id, date, type, token)
-    )''')
+    cursor.execute(ARKHAM_TRANSACTIONS_DDL)
     cursor.execute('''
-        INSERT INTO arkham_transactions (entity_id, date, type, amount, amount_usd, token)
+        INSERT OR REPLACE INTO arkham_transactions (entity_id, date, type, amount, amount_usd, token)
         SELECT entity_id, date, type, amount, amount_usd, 'UNKNOWN' 
         FROM arkham_transactions_old
+        WHERE entity_id IS NOT NULL
     ''')
     cursor.execute("DROP TABLE arkham_transactions_old")
 
-def init_db():
+def migrate_without_rowid(cursor, table, ddl, columns):
+    """Rebuild a composite-PK table as WITHOUT ROWID if it still has an implicit rowid."""
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    row = cursor.fetchone()
+    if not row or 'WITHOUT ROWID' in row[0].upper():
+        return
+    logger.info(f"Migrating {table} table to WITHOUT ROWID")
+    column_list = ', '.join(columns)
+    cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+    cursor.execute(ddl)
+    cursor.execute(f'''
+        INSERT OR REPLACE INTO {table} ({column_list})
+        SELECT {column_list} FROM {table}_old
+        WHERE entity_id IS NOT NULL
+    ''')
+    cursor.execute(f"DROP TABLE {table}_old")
+
+def init_db(conn):
     """Initialize database tables and indexes."""
     try:
-        conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
         cursor.execute("PRAGMA table_info(arkham_transactions)")
         columns = [info[1] for info in cursor.fetchall()]
-        if 'token' not in columns:
+        if columns and 'token' not in columns:
             migrate_arkham_transactions(cursor)
-        cursor.execute('''CREATE TABLE IF NOT EXISTS arkham_wallets (
-            entity_id TEXT, token TEXT NOT NULL, balance REAL NOT NULL, balance_usd REAL NOT NULL, 
-            timestamp TEXT NOT NULL,
-            PRIMARY KEY (entity_id, token, timestamp)
-        )''')
-        cursor.execute('''CREATE INDEX IF NOT EXISTS idx_wallets_timestamp 
-                         ON arkham_wallets (entity_id, token, timestamp)''')
+        migrate_without_rowid(cursor, 'arkham_transactions', ARKHAM_TRANSACTIONS_DDL,
+                              ['entity_id', 'date', 'type', 'amount', 'amount_usd', 'token'])
+        migrate_without_rowid(cursor, 'arkham_wallets', ARKHAM_WALLETS_DDL,
+                              ['entity_id', 'token', 'balance', 'balance_usd', 'timestamp'])
+        cursor.execute(ARKHAM_TRANSACTIONS_DDL)
+        cursor.execute(ARKHAM_WALLETS_DDL)
+        cursor.execute(PRICE_CACHE_DDL)
+        # arkham_wallets' WITHOUT ROWID primary key already orders rows by (entity_id, token, timestamp)
+        cursor.execute("DROP INDEX IF EXISTS idx_wallets_timestamp")
         cursor.execute('''CREATE INDEX IF NOT EXISTS idx_transactions_token 
                          ON arkham_transactions (entity_id, token, date)''')
         conn.commit()
@@ -105,209 +228,349 @@ def init_db():
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
         raise
-    finally:
-        conn.close()
+
+def load_api_cache(key, ttl):
+    """Return a cached Arkham response younger than ttl seconds, or None."""
+    # Own short-lived connection: callers run on executor threads
+    try:
+        with sqlite3.connect(DB_PATH, timeout=10) as conn:
+            conn.execute(API_CACHE_DDL)
+            row = conn.execute(SQL_SELECT_API_CACHE, (key, time.time() - ttl)).fetchone()
+    except sqlite3.Error as e:
+        logger.warning(f"API cache read failed for {key}: {e}")
+        return None
+    return orjson.loads(row[0]) if row else None
+
+def store_api_cache(key, data):
+    """Persist an Arkham response for later runs."""
+    try:
+        with sqlite3.connect(DB_PATH, timeout=10) as conn:
+            conn.execute(API_CACHE_DDL)
+            conn.execute(SQL_INSERT_API_CACHE, (key, time.time(), orjson.dumps(data)))
+    except sqlite3.Error as e:
+        logger.warning(f"API cache write failed for {key}: {e}")
 
 def check_api_key(api_key):
     """Validate the Arkham API key."""
     endpoint = "https://api.arkhamintelligence.com/health"
     headers = {"API-Key": api_key, "Content-Type": "application/json"}
-    with create_session() as session:
-        try:
-            logger.info(f"Checking API key validity at {endpoint}")
-            response = session.get(endpoint, headers=headers, timeout=20)
-            response.raise_for_status()
-            logger.info(f"API key is valid. Response: {response.text}")
-            return True
-        except requests.RequestException as e:
-            logger.error(f"Failed to validate API key: {e} | Status: {getattr(e.response, 'status_code', 'N/A')}")
-            return False
+    try:
+        logger.info(f"Checking API key validity at {endpoint}")
+        response = SESSION.get(endpoint, headers=headers, timeout=20)
+        response.raise_for_status()
+        logger.info(f"API key is valid. Response: {response.text}")
+        return True
+    except requests.RequestException as e:
+        logger.error(f"Failed to validate API key: {e} | Status: {getattr(e.response, 'status_code', 'N/A')}")
+        return False
 
 def fetch_blackrock_entity(api_key):
     """Fetch BlackRock entity data from Arkham API."""
+    if (cached := load_api_cache('entity:blackrock', ENTITY_CACHE_TTL)) is not None:
+        logger.info("Using cached BlackRock entity data")
+        return cached
     base_url = "https://api.arkhamintelligence.com"
     endpoint = f"{base_url}/intelligence/entity/blackrock"
     headers = {"API-Key": api_key, "Content-Type": "application/json"}
-    with create_session() as session:
-        try:
-            logger.info(f"Fetching BlackRock entity data from {endpoint}")
-            response = session.get(endpoint, headers=headers, timeout=20)
-            response.raise_for_status()
-            data = response.json()
-            entity_id = data.get('id')
-            if not entity_id:
-                logger.error(f"No id found in BlackRock entity data: {data}")
-                return None
-            logger.info(f"Successfully fetched BlackRock entity data: {entity_id}")
-            return data
-        except requests.RequestException as e:
-            logger.error(f"Failed to fetch BlackRock entity data: {e} | Status: {getattr(e.response, 'status_code', 'N/A')}")
+    try:
+        logger.info(f"Fetching BlackRock entity data from {endpoint}")
+        response = SESSION.get(endpoint, headers=headers, timeout=20)
+        response.raise_for_status()
+        data = response.json()
+        entity_id = data.get('id')
+        if not entity_id:
+            logger.error(f"No id found in BlackRock entity data: {data}")
             return None
+        logger.info(f"Successfully fetched BlackRock entity data: {entity_id}")
+        store_api_cache('entity:blackrock', data)
+        return data
+    except requests.RequestException as e:
+        logger.error(f"Failed to fetch BlackRock entity data: {e} | Status: {getattr(e.response, 'status_code', 'N/A')}")
+        return None
 
 def fetch_blackrock_addresses(api_key, entity_id):
     """Fetch addresses associated with BlackRock entity."""
+    cache_key = f'addresses:{entity_id}'
+    if (cached := load_api_cache(cache_key, ADDRESS_CACHE_TTL)) is not None:
+        logger.info(f"Using {len(cached)} cached addresses for entity {entity_id}")
+        return cached
     base_url = "https://api.arkhamintelligence.com"
     endpoint = f"{base_url}/intelligence/entity/{entity_id}/addresses"
     headers = {"API-Key": api_key, "Content-Type": "application/json"}
-    with create_session() as session:
-        try:
-            logger.info(f"Fetching addresses for entity {entity_id}")
-            response = session.get(endpoint, headers=headers, timeout=20)
-            response.raise_for_status()
-            data = response.json()
-            addresses = data.get('addresses', [])
-            logger.info(f"Fetched {len(addresses)} addresses: {addresses[:5]}")
-            return addresses
-        except requests.RequestException as e:
-            logger.error(f"Failed to fetch addresses: {e} | Status: {getattr(e.response, 'status_code', 'N/A')}")
-            logger.warning("Using fallback addresses due to API failure")
-            return FALLBACK_ADDRESSES
+    try:
+        logger.info(f"Fetching addresses for entity {entity_id}")
+        response = SESSION.get(endpoint, headers=headers, timeout=20)
+        response.raise_for_status()
+        data = response.json()
+        addresses = data.get('addresses', [])
+        logger.info(f"Fetched {len(addresses)} addresses: {addresses[:5]}")
+        if addresses:
+            store_api_cache(cache_key, addresses)
+        return addresses
+    except requests.RequestException as e:
+        logger.error(f"Failed to fetch addresses: {e} | Status: {getattr(e.response, 'status_code', 'N/A')}")
+        logger.warning("Using fallback addresses due to API failure")
+        return FALLBACK_ADDRESSES
 
 def fetch_arkham_balances(api_key, entity_id):
     """Fetch balance data for a given entity from Arkham API."""
     base_url = "https://api.arkhamintelligence.com"
     url = f"{base_url}/balances/entity/{entity_id}"
     headers = {"API-Key": api_key, "Content-Type": "application/json"}
-    with create_session() as session:
-        try:
-            logger.info(f"Fetching balances for entity {entity_id}")
-            response = session.get(url, headers=headers, timeout=20)
-            response.raise_for_status()
-            data = response.json()
-            balances = []
-            balances_dict = data.get('balances', {})
-            for chain in balances_dict:
-                chain_balances = balances_dict.get(chain, [])
-                if isinstance(chain_balances, list):
-                    balances.extend([balance for balance in chain_balances if 'symbol' in balance and 'balance' in balance and 'usd' in balance])
-            logger.info(f"Fetched {len(balances)} balances from Arkham")
-            return balances
-        except requests.RequestException as e:
-            logger.error(f"Failed to fetch balances: {e} | Status: {getattr(e.response, 'status_code', 'N/A')}")
-            return []
-
-def fetch_arkham_transactions(api_key, entity_id, start_date, end_date, symbol=None):
-    """Fetch transaction history for a given entity from Arkham API."""
+    try:
+        logger.info(f"Fetching balances for entity {entity_id}")
+        response = SESSION.get(url, headers=headers, timeout=20)
+        response.raise_for_status()
+        data = response.json()
+        balances = []
+        balances_dict = data.get('balances', {})
+        for chain in balances_dict:
+            chain_balances = balances_dict.get(chain, [])
+            if isinstance(chain_balances, list):
+                balances.extend([balance for balance in chain_balances if 'symbol' in balance and 'balance' in balance and 'usd' in balance])
+        logger.info(f"Fetched {len(balances)} balances from Arkham")
+        return balances
+    except requests.RequestException as e:
+        logger.error(f"Failed to fetch balances: {e} | Status: {getattr(e.response, 'status_code', 'N/A')}")
+        return []
+
+def iter_arkham_transactions(api_key, entity_id, start_date, end_date, symbol=None):
+    """Yield transaction history for a given entity from Arkham API, one page at a time."""
     base_url = "https://api.arkhamintelligence.com"
     url = f"{base_url}/history/entity/{entity_id}"
     headers = {"API-Key": api_key, "Content-Type": "application/json"}
     params = {"startDate": start_date, "endDate": end_date, "limit": 100}
     if symbol:
         params["tokenSymbol"] = symbol.upper()
-    transactions = []
-    with create_session() as session:
-        try:
-            logger.info(f"Fetching transactions for entity {entity_id} from {start_date} to {end_date}{f' for {symbol}' if symbol else ''}")
-            while True:
-                response = session.get(url, headers=headers, params=params, timeout=20)
-                response.raise_for_status()
-                data = response.json()
-                transactions.extend(data.get('transfers', []))
-                if not (next_page := data.get('nextPage')):
-                    break
-                params['page'] = next_page
-            logger.info(f"Fetched {len(transactions)} transactions")
-            return transactions
-        except requests.RequestException as e:
-            logger.error(f"Failed to fetch transactions: {e} | Status: {getattr(e.response, 'status_code', 'N/A')}")
-            return transactions
-        finally:
-            session.close()
+    fetched = 0
+    try:
+        logger.info(f"Fetching transactions for entity {entity_id} from {start_date} to {end_date}{f' for {symbol}' if symbol else ''}")
+        while True:
+            response = SESSION.get(url, headers=headers, params=params, timeout=20)
+            response.raise_for_status()
+            data = response.json()
+            transfers = data.get('transfers', [])
+            fetched += len(transfers)
+            yield from transfers
+            if not (next_page := data.get('nextPage')):
+                break
+            params['page'] = next_page
+        logger.info(f"Fetched {fetched} transactions")
+    except requests.RequestException as e:
+        logger.error(f"Failed to fetch transactions: {e} | Status: {getattr(e.response, 'status_code', 'N/A')}")
 
-def fetch_address_transactions(api_key, address, start_date, end_date, symbol=None):
-    """Fetch transaction history for a specific address."""
+async def fetch_address_transactions_async(session, sem, address, start_date, end_date, symbol=None):
+    """Fetch transaction history for a specific address, bounded by a shared semaphore."""
     base_url = "https://api.arkhamintelligence.com"
     url = f"{base_url}/history/address/{address}"
-    headers = {"API-Key": api_key, "Content-Type": "application/json"}
     params = {"startDate": start_date, "endDate": end_date, "limit": 100}
     if symbol:
         params["tokenSymbol"] = symbol.upper()
     transactions = []
-    with create_session() as session:
+    async with sem:
         try:
             logger.info(f"Fetching transactions for address {address} from {start_date} to {end_date}")
             while True:
-                response = session.get(url, headers=headers, params=params, timeout=20)
-                response.raise_for_status()
-                data = response.json()
+                async with session.get(url, params=params) as response:
+                    response.raise_for_status()
+                    data = await response.json()
                 transactions.extend(data.get('transfers', []))
                 if not (next_page := data.get('nextPage')):
                     break
                 params['page'] = next_page
             logger.info(f"Fetched {len(transactions)} transactions for address {address}")
-            return transactions
-        except requests.RequestException as e:
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             logger.error(f"Failed to fetch transactions for address {address}: {e}")
-            return transactions
+    return transactions
+
+async def gather_address_transactions(api_key, addresses, start_date, end_date, symbol=None):
+    """Fetch several addresses concurrently, at most ADDRESS_FETCH_CONCURRENCY in flight."""
+    sem = asyncio.Semaphore(ADDRESS_FETCH_CONCURRENCY)
+    headers = {"API-Key": api_key, "Content-Type": "application/json", "User-Agent": "WhaleScope/1.0 (BlackRockScript)"}
+    # Every address hits the same Arkham host, so resolve it once and keep the sockets
+    connector = aiohttp.TCPConnector(limit_per_host=ADDRESS_FETCH_CONCURRENCY, ttl_dns_cache=300)
+    async with aiohttp.ClientSession(connector=connector, headers=headers, timeout=aiohttp.ClientTimeout(total=20)) as session:
+        return await asyncio.gather(*(
+            fetch_address_transactions_async(session, sem, address, start_date, end_date, symbol)
+            for address in addresses
+        ))
+
+def iter_blackrock_transactions(api_key, entity_id, start_date, end_date, symbol=None):
+    """Yield entity transactions, falling back to per-address history when the entity has none."""
+    found = False
+    for tx in iter_arkham_transactions(api_key, entity_id, start_date, end_date, symbol):
+        found = True
+        yield tx
+    if found:
+        return
+    logger.info("No entity transactions found, attempting address-based queries")
+    if addresses := fetch_blackrock_addresses(api_key, entity_id):
+        run = uvloop.run if uvloop else asyncio.run
+        for transfers in run(gather_address_transactions(api_key, addresses[:20], start_date, end_date, symbol)):
+            yield from transfers
+    else:
+        logger.warning("No addresses found for entity blackrock, likely custodial holdings")
+
+def prefetch(executor, iterable, maxsize=PREFETCH_MAX_ITEMS):
+    """Drain an iterable on an executor thread, yielding its items as they arrive.
+
+    At most `maxsize` items are buffered, so the producer stays a few pages
+    ahead instead of holding the whole download. Closing the returned
+    generator (or dropping it) releases a producer blocked on a full queue.
+    """
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    done = object()
+
+    def offer(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=PREFETCH_POLL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def pump():
+        try:
+            for item in iterable:
+                if not offer(item):
+                    return
+        finally:
+            offer(done)
+
+    future = executor.submit(pump)
+
+    def drain():
+        try:
+            yield  # Primed below, so close() always reaches the finally
+            while (item := items.get()) is not done:
+                yield item
+            future.result()  # Re-raise any error from the producer
         finally:
-            session.close()
+            stop.set()
+
+    consumer = drain()
+    next(consumer)
+    return consumer
+
+def empty_exchange_usage():
+    """Return an empty deposits/withdrawals summary."""
+    return {"deposits": {"total": 0, "summary": []}, "withdrawals": {"total": 0, "summary": []}}
+
+def record_exchange_transfer(exchange_usage, transfer):
+    """Add a single transfer to the running exchange deposits/withdrawals."""
+    usd_value = float(transfer.get('usdValue', 0))
+    from_address = transfer.get('fromAddress', '')
+    to_address = transfer.get('toAddress', '')
+    if isinstance(from_address, dict):
+        from_address = from_address.get('address', '')
+    if isinstance(to_address, dict):
+        to_address = to_address.get('address', '')
+    if EXCHANGE_RE.search(from_address):
+        exchange_usage["withdrawals"]["total"] += usd_value
+        exchange_usage["withdrawals"]["summary"].append(transfer)
+    elif EXCHANGE_RE.search(to_address):
+        exchange_usage["deposits"]["total"] += usd_value
+        exchange_usage["deposits"]["summary"].append(transfer)
 
 def process_exchange_usage(transactions, entity_id):
     """Process exchange usage (deposits and withdrawals) from transactions."""
     try:
         logger.info(f"Processing exchange usage for entity {entity_id}")
-        deposits = {"total": 0, "summary": []}
-        withdrawals = {"total": 0, "summary": []}
+        exchange_usage = empty_exchange_usage()
         for transfer in transactions:
-            usd_value = float(transfer.get('usdValue', 0))
-            from_address = transfer.get('fromAddress', '')
-            to_address = transfer.get('toAddress', '')
-            if isinstance(from_address, dict):
-                from_address = from_address.get('address', '')
-            if isinstance(to_address, dict):
-                to_address = to_address.get('address', '')
-            if 'exchange' in from_address.lower():
-                withdrawals["total"] += usd_value
-                withdrawals["summary"].append(transfer)
-            elif 'exchange' in to_address.lower():
-                deposits["total"] += usd_value
-                deposits["summary"].append(transfer)
-        logger.info(f"Exchange usage: Deposits ${deposits['total']:,.2f}, Withdrawals ${withdrawals['total']:,.2f}")
-        return {"deposits": deposits, "withdrawals": withdrawals}
+            record_exchange_transfer(exchange_usage, transfer)
+        logger.info(f"Exchange usage: Deposits ${exchange_usage['deposits']['total']:,.2f}, Withdrawals ${exchange_usage['withdrawals']['total']:,.2f}")
+        return exchange_usage
     except Exception as e:
         logger.error(f"Failed to process exchange usage: {e}")
-        return {"deposits": {"total": 0, "summary": []}, "withdrawals": {"total": 0, "summary": []}}
+        return empty_exchange_usage()
+
+def load_cached_prices(conn, start_date, end_date):
+    """Load cached prices for a date range; past days never expire, today's expire after PRICE_CACHE_TTL."""
+    today = datetime.now().strftime('%Y-%m-%d')
+    cursor = conn.cursor()
+    cursor.execute(SQL_SELECT_CACHED_PRICES, (start_date, end_date, today, time.time() - PRICE_CACHE_TTL))
+    cached = {}
+    for symbol, date, price in cursor.fetchall():
+        cached.setdefault(symbol, {})[date] = price
+    return cached
+
+def aggregate_balances(balances):
+    """Sum balance and USD value per upper-cased symbol, keeping first-seen order.
 
-def derive_prices_from_balances(balances, start_date, end_date):
-    """Derive historical prices from Arkham balances."""
+    'price' is the unit price of the symbol's last balance row (USDC falls back
+    to 1.0 and everything else to 0.0 when that row holds no balance).
+    """
+    df = pd.DataFrame.from_records(balances, columns=['symbol', 'balance', 'usd'])
+    df['symbol'] = df['symbol'].fillna('').astype(str).str.upper()
+    for column in ('balance', 'usd'):
+        df[column] = pd.to_numeric(df[column], errors='coerce').fillna(0.0).astype(float)
+    fallback = np.where(df['symbol'] == 'USDC', 1.0, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df['price'] = np.where(df['balance'] > 0, (df['usd'] / df['balance']).round(2), fallback)
+    return df.groupby('symbol', sort=False).agg(balance=('balance', 'sum'), usd=('usd', 'sum'), price=('price', 'last'))
+
+def derive_prices_from_balances(conn, balances, start_date, end_date):
+    """Derive historical prices from Arkham balances, reusing prices cached by earlier runs."""
     prices = {'BTC': {}, 'ETH': {}, 'USDC': {}}
     try:
         logger.info("Deriving prices for BTC, ETH, and USDC from Arkham balances")
+        # Last balance listed per tracked token wins
+        latest = {}
+        for balance in balances:
+            token = balance.get('symbol', '').upper()
+            if token in TRACKED_TOKENS:
+                latest[token] = balance
+        tokens = np.array(list(latest), dtype=object)
+        amounts = np.fromiter((float(b.get('balance', 0)) for b in latest.values()), dtype=np.float64, count=len(latest))
+        usd = np.fromiter((float(b.get('usd', 0)) for b in latest.values()), dtype=np.float64, count=len(latest))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            derived_prices = np.where(amounts > 0, np.round(usd / amounts, 2), np.where(tokens == 'USDC', 1.0, 0.0))
+        derived = dict(zip(latest, derived_prices.tolist()))
+        # Ranges reaching past today are never cached
+        use_cache = end_date <= datetime.now().strftime('%Y-%m-%d')
+        cached = load_cached_prices(conn, start_date, end_date) if use_cache else {}
         start = datetime.strptime(start_date, '%Y-%m-%d')
         end = datetime.strptime(end_date, '%Y-%m-%d')
         delta = end - start
+        fetched_at = time.time()
+        new_rows = []
         for i in range(0, delta.days + 1, 7):
             date = (start + timedelta(days=i)).strftime('%Y-%m-%d')
-            for balance in balances:
-                token = balance.get('symbol', '').upper()
-                if token in ['BTC', 'ETH', 'USDC']:
-                    balance_amount = float(balance.get('balance', 0))
-                    balance_usd = float(balance.get('usd', 0))
-                    if balance_amount > 0:
-                        prices[token][date] = round(balance_usd / balance_amount, 2)
-                    else:
-                        prices[token][date] = 1.0 if token == 'USDC' else 0.0
-        logger.info(f"Derived {len(prices['BTC'])} prices for BTC, {len(prices['ETH'])} for ETH, {len(prices['USDC'])} for USDC")
+            for token, price in derived.items():
+                if (cached_price := cached.get(token, {}).get(date)) is not None:
+                    prices[token][date] = cached_price
+                else:
+                    prices[token][date] = price
+                    new_rows.append((token, date, price, fetched_at))
+        if use_cache and new_rows:
+            conn.executemany(SQL_INSERT_CACHED_PRICE, new_rows)
+            conn.commit()
+        logger.info(f"Derived {len(prices['BTC'])} prices for BTC, {len(prices['ETH'])} for ETH, {len(prices['USDC'])} for USDC ({len(new_rows)} newly cached)")
         return prices
     except Exception as e:
+        conn.rollback()
         logger.error(f"Failed to derive prices: {e}")
         return prices
 
-def ensure_historical_wallet_data(entity_id, start_date, end_date, balances, historical_prices):
+def index_prices_by_ordinal(prices):
+    """Re-key {token: {'YYYY-MM-DD': price}} by proleptic day ordinal for integer lookups."""
+    return {
+        token: {datetime.fromisoformat(date).toordinal(): price for date, price in date_map.items()}
+        for token, date_map in prices.items()
+    }
+
+def ensure_historical_wallet_data(conn, entity_id, start_date, end_date, balances, price_by_ord):
     """Populate historical wallet data with price-adjusted USD values."""
     try:
-        conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
         start = datetime.strptime(start_date, '%Y-%m-%d')
         end = datetime.strptime(end_date, '%Y-%m-%d')
-        cursor.execute('''
-            DELETE FROM arkham_wallets 
-            WHERE entity_id = ? 
-            AND timestamp BETWEEN ? AND ?
-        ''', (entity_id, start.strftime('%Y-%m-%d 00:00:00'), end.strftime('%Y-%m-%d 23:59:59')))
-        conn.commit()
+        cursor.execute(SQL_DELETE_WALLETS_RANGE, (entity_id, start.strftime('%Y-%m-%d 00:00:00'), end.strftime('%Y-%m-%d 23:59:59')))
         delta = end - start
-        inserted = 0
+        rows = []
         aggregated_balances = {}
         for balance in balances:
             token = balance['symbol'].upper()
@@ -318,31 +581,26 @@ def ensure_historical_wallet_data(entity_id, start_date, end_date, balances, his
                 aggregated_balances[token]['usd'] += balance_usd
             else:
                 aggregated_balances[token] = {'symbol': token, 'balance': balance_amount, 'usd': balance_usd}
+        start_ord = start.toordinal()
         for token, agg_balance in aggregated_balances.items():
+            token_prices = price_by_ord.get(token, {})
             for i in range(0, delta.days + 1, 7):
                 timestamp = (start + timedelta(days=i)).strftime('%Y-%m-%d 12:00:00')
-                date = (start + timedelta(days=i)).strftime('%Y-%m-%d')
-                price = historical_prices.get(token, {}).get(date, 0.0)
+                price = token_prices.get(start_ord + i, 0.0)
                 adjusted_usd = agg_balance['balance'] * price if price else agg_balance['usd']
-                cursor.execute('''
-                    INSERT OR REPLACE INTO arkham_wallets (entity_id, token, balance, balance_usd, timestamp)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (entity_id, token, agg_balance['balance'], adjusted_usd, timestamp))
-                inserted += 1
+                rows.append((entity_id, token, agg_balance['balance'], adjusted_usd, timestamp))
+        cursor.executemany(SQL_INSERT_WALLET, rows)
         conn.commit()
-        logger.info(f"Populated {inserted} historical wallet entries")
+        logger.info(f"Populated {len(rows)} historical wallet entries")
         return list(aggregated_balances.values())
     except Exception as e:
+        conn.rollback()
         logger.error(f"Failed to ensure historical wallet data: {e}")
         return balances
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
-def fetch_historical_balances(entity_id, start_date, end_date):
+def fetch_historical_balances(conn, entity_id, start_date, end_date):
     """Fetch historical balances for BTC, ETH, and USDC from the database."""
     try:
-        conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
         start_datetime = datetime.strptime(start_date, '%Y-%m-%d').strftime('%Y-%m-%d 00:00:00')
         end_datetime = datetime.strptime(end_date, '%Y-%m-%d').strftime('%Y-%m-%d 23:59:59')
@@ -375,14 +633,10 @@ def fetch_historical_balances(entity_id, start_date, end_date):
     except Exception as e:
         logger.error(f"Failed to fetch historical balances: {e}")
         return {'BTC': [], 'ETH': [], 'USDC': []}
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
-def fetch_historical_total_balance(entity_id, start_date, end_date):
+def fetch_historical_total_balance(conn, entity_id, start_date, end_date):
     """Fetch historical total balance across all tokens from the database."""
     try:
-        conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
         start_datetime = datetime.strptime(start_date, '%Y-%m-%d').strftime('%Y-%m-%d 00:00:00')
         end_datetime = datetime.strptime(end_date, '%Y-%m-%d').strftime('%Y-%m-%d 23:59:59')
@@ -409,24 +663,34 @@ def fetch_historical_total_balance(entity_id, start_date, end_date):
     except Exception as e:
         logger.error(f"Failed to fetch historical total balance: {e}")
         return []
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
-def process_transactions(transactions, historical_prices, symbol=None):
-    """Process and store transactions in the database."""
+def process_transactions(conn, transactions, price_by_ord, symbol=None, exchange_usage=None):
+    """Process and store transactions in the database.
+
+    Accepts any iterable so paginated fetches can be streamed straight into
+    SQLite in TX_BATCH_SIZE chunks. When exchange_usage is given, every raw
+    transfer is also recorded there in the same pass.
+    """
     result = {}
-    inserted = 0
+    rows = []
+    stored = 0
+    # Arkham already filters by tokenSymbol; this only guards the fallback paths
+    wanted = symbol.upper() if symbol else None
     try:
-        conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
         for tx in transactions:
+            if exchange_usage is not None:
+                record_exchange_transfer(exchange_usage, tx)
             token = tx.get('tokenSymbol', '').upper()
-            if symbol and token != symbol.upper():
+            if wanted and token != wanted:
                 continue
             date = tx.get('blockTimestamp', '').split('T')[0]
             if not date:
                 continue
+            try:
+                day = datetime.fromisoformat(date).toordinal()
+            except ValueError:
+                continue
             to_address = tx.get('toAddress', '')
             if isinstance(to_address, dict):
                 to_address = to_address.get('address', '')
@@ -439,20 +703,22 @@ def process_transactions(transactions, historical_prices, symbol=None):
                 result[token] = {}
             if date not in result[token]:
                 result[token][date] = {'buys': 0.0, 'sells': 0.0, 'buys_usd': 0.0, 'sells_usd': 0.0}
-            price = historical_prices.get(token, {}).get(date, 0.0)
+            price = price_by_ord.get(token, {}).get(day, 0.0)
             if tx_type == 'buy':
                 result[token][date]['buys'] += amount
                 result[token][date]['buys_usd'] += amount * price if price else amount_usd
             else:
                 result[token][date]['sells'] += amount
                 result[token][date]['sells_usd'] += amount * price if price else amount_usd
-            cursor.execute('''
-                INSERT OR REPLACE INTO arkham_transactions (entity_id, date, type, amount, amount_usd, token)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', ('blackrock', date, tx_type, amount, amount_usd, token))
-            inserted += 1
+            rows.append(('blackrock', date, tx_type, amount, amount_usd, token))
+            if len(rows) >= TX_BATCH_SIZE:
+                cursor.executemany(SQL_INSERT_TX, rows)
+                stored += len(rows)
+                rows.clear()
+        cursor.executemany(SQL_INSERT_TX, rows)
+        stored += len(rows)
         conn.commit()
-        logger.info(f"Stored {inserted} transactions")
+        logger.info(f"Stored {stored} transactions")
         for token in result:
             result[token] = [
                 {
@@ -466,27 +732,20 @@ def process_transactions(transactions, historical_prices, symbol=None):
             ]
         return result
     except Exception as e:
+        conn.rollback()
         logger.error(f"Failed to process transactions: {e}")
         return {}
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
-def update_wallets(entity_id, balances):
+def update_wallets(conn, entity_id, balances):
     """Update wallet balances in the database."""
     wallet_data = []
     try:
-        conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         for balance in balances:
             token = balance.get('symbol', balance.get('tokenSymbol', 'UNKNOWN')).upper()
             amount = float(balance.get('balance', 0))
             amount_usd = float(balance.get('usd', balance.get('usdValue', 0)))
-            cursor.execute('''
-                INSERT OR REPLACE INTO arkham_wallets (entity_id, token, balance, balance_usd, timestamp)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (entity_id, token, amount, amount_usd, timestamp))
             wallet_data.append({
                 'entity_id': entity_id,
                 'token': token,
@@ -494,76 +753,77 @@ def update_wallets(entity_id, balances):
                 'balance_usd': amount_usd,
                 'timestamp': timestamp
             })
+        cursor.executemany(SQL_INSERT_WALLET, [
+            (w['entity_id'], w['token'], w['balance'], w['balance_usd'], w['timestamp'])
+            for w in wallet_data
+        ])
         conn.commit()
         logger.info(f"Inserted {len(wallet_data)} wallet entries")
         return wallet_data
     except Exception as e:
+        conn.rollback()
         logger.error(f"Failed to update wallets: {e}")
         return []
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 def generate_visualizations(historical_balances, historical_total_balance, transactions, output_dir):
     """Generate visualizations for historical balances and transactions."""
+    fig, ax = plt.subplots(figsize=(12, 6))
     try:
         # Plot 1: Historical Total Balance
         dates = [datetime.strptime(entry['week_end'], '%Y-%m-%d') for entry in historical_total_balance]
         total_balances = [entry['total_balance_usd'] / 1e9 for entry in historical_total_balance]
-        plt.figure(figsize=(12, 6))
-        plt.plot(dates, total_balances, marker='o', label='Total Balance (USD Billions)')
+        date_to_idx = {d: i for i, d in enumerate(dates)}
+        ax.plot(dates, total_balances, marker='o', label='Total Balance (USD Billions)')
         for event in FED_EVENTS:
             event_date = datetime.strptime(event['date'], '%Y-%m-%d')
-            if event_date in dates:
-                idx = dates.index(event_date)
-                plt.annotate(event['event'], (dates[idx], total_balances[idx]), textcoords="offset points", xytext=(0,10), ha='center')
-        plt.title("BlackRock Historical Total Balance (USD)")
-        plt.xlabel("Date")
-        plt.ylabel("Balance (Billions USD)")
-        plt.xticks(rotation=45)
-        plt.legend()
-        plt.tight_layout()
-        plt.savefig(os.path.join(output_dir, "total_balance.png"))
-        plt.close()
+            if (idx := date_to_idx.get(event_date)) is not None:
+                ax.annotate(event['event'], (dates[idx], total_balances[idx]), textcoords="offset points", xytext=(0,10), ha='center')
+        ax.set_title("BlackRock Historical Total Balance (USD)")
+        ax.set_xlabel("Date")
+        ax.set_ylabel("Balance (Billions USD)")
+        ax.tick_params(axis='x', labelrotation=45)
+        ax.legend()
+        fig.tight_layout()
+        fig.savefig(os.path.join(output_dir, "total_balance.png"))
         logger.info("Generated total balance plot")
 
         # Plot 2: BTC, ETH, and USDC Balances
-        plt.figure(figsize=(12, 6))
+        ax.clear()
         for token in ['BTC', 'ETH', 'USDC']:
             if (token_data := historical_balances.get(token, [])):
                 dates = [datetime.strptime(entry['week_end'], '%Y-%m-%d') for entry in token_data]
                 balances = [entry['balance_usd'] / 1e9 for entry in token_data] if token == 'BTC' else [entry['balance'] for entry in token_data]
-                plt.plot(dates, balances, marker='o', label=f"{token} {'Balance (Billions USD)' if token == 'BTC' else 'Balance'}")
-        plt.title("BlackRock BTC, ETH, and USDC Balances")
-        plt.xlabel("Date")
-        plt.ylabel("Balance")
-        plt.xticks(rotation=45)
-        plt.legend()
-        plt.tight_layout()
-        plt.savefig(os.path.join(output_dir, "btc_eth_usdc_balances.png"))
-        plt.close()
+                ax.plot(dates, balances, marker='o', label=f"{token} {'Balance (Billions USD)' if token == 'BTC' else 'Balance'}")
+        ax.set_title("BlackRock BTC, ETH, and USDC Balances")
+        ax.set_xlabel("Date")
+        ax.set_ylabel("Balance")
+        ax.tick_params(axis='x', labelrotation=45)
+        ax.legend()
+        fig.tight_layout()
+        fig.savefig(os.path.join(output_dir, "btc_eth_usdc_balances.png"))
         logger.info("Generated BTC/ETH/USDC balance plot")
 
         # Plot 3: Transaction Volumes (if available)
         if transactions:
-            plt.figure(figsize=(12, 6))
+            ax.clear()
             for token, tx_data in transactions.items():
                 dates = [datetime.strptime(tx['date'], '%Y-%m-%d') for tx in tx_data]
                 buys = [tx['buys_usd'] / 1e6 for tx in tx_data]
                 sells = [tx['sells_usd'] / 1e6 for tx in tx_data]
-                plt.plot(dates, buys, marker='o', label=f"{token} Buys (Millions USD)")
-                plt.plot(dates, sells, marker='x', label=f"{token} Sells (Millions USD)")
-            plt.title("BlackRock Transaction Volumes")
-            plt.xlabel("Date")
-            plt.ylabel("Volume (Millions USD)")
-            plt.xticks(rotation=45)
-            plt.legend()
-            plt.tight_layout()
-            plt.savefig(os.path.join(output_dir, "transaction_volumes.png"))
-            plt.close()
+                ax.plot(dates, buys, marker='o', label=f"{token} Buys (Millions USD)")
+                ax.plot(dates, sells, marker='x', label=f"{token} Sells (Millions USD)")
+            ax.set_title("BlackRock Transaction Volumes")
+            ax.set_xlabel("Date")
+            ax.set_ylabel("Volume (Millions USD)")
+            ax.tick_params(axis='x', labelrotation=45)
+            ax.legend()
+            fig.tight_layout()
+            fig.savefig(os.path.join(output_dir, "transaction_volumes.png"))
             logger.info("Generated transaction volume plot")
     except Exception as e:
         logger.error(f"Failed to generate visualizations: {e}")
+    finally:
+        plt.close(fig)
 
 def analyze_insights(total_balance_usd, holdings_by_chain, transactions, historical_balances, historical_total_balance):
     """Generate AI-driven insights for market researchers."""
@@ -583,24 +843,24 @@ def analyze_insights(total_balance_usd, holdings_by_chain, transactions, histori
             insights.append("BTC holdings are stable, suggesting a long-term HODLing strategy.")
         else:
             insights.append("BTC holdings show variation, indicating active portfolio management.")
-        for event in FED_EVENTS:
-            event_date = event['date']
-            for tx_data in transactions.values():
+        # Parse every date once; per-token transaction lists are date-sorted, so each FED window is a bisect
+        tx_days = {token: [datetime.fromisoformat(tx['date']).toordinal() for tx in tx_data] for token, tx_data in transactions.items()}
+        balance_days = [datetime.fromisoformat(balance['week_end']).toordinal() for balance in historical_total_balance]
+        event_days = [(event, datetime.fromisoformat(event['date']).toordinal()) for event in FED_EVENTS]
+        for event, event_day in event_days:
+            for token, tx_data in transactions.items():
+                days = tx_days[token]
+                window = tx_data[bisect_left(days, event_day - 3):bisect_right(days, event_day + 3)]
                 insights.extend(
-                    [
-                        f"Transaction on {tx['date']} (${tx['buys_usd'] + tx['sells_usd']:,.2f} USD) near FED event: {event['event']}"
-                        for tx in tx_data
-                        if abs((datetime.strptime(tx['date'], '%Y-%m-%d') - datetime.strptime(event_date, '%Y-%m-%d')).days) <= 3
-                    ]
+                    f"Transaction on {tx['date']} (${tx['buys_usd'] + tx['sells_usd']:,.2f} USD) near FED event: {event['event']}"
+                    for tx in window
                 )
             insights.extend(
-                [
-                    f"Balance change on {balance['week_end']} (${balance['total_balance_usd']:,.2f}) near FED event: {event['event']}"
-                    for balance in historical_total_balance
-                    if abs((datetime.strptime(balance['week_end'], '%Y-%m-%d') - datetime.strptime(event_date, '%Y-%m-%d')).days) <= 7
-                ]
+                f"Balance change on {balance['week_end']} (${balance['total_balance_usd']:,.2f}) near FED event: {event['event']}"
+                for balance, day in zip(historical_total_balance, balance_days)
+                if abs(day - event_day) <= 7
             )
-        if not transactions and all(abs((datetime.strptime(balance['week_end'], '%Y-%m-%d') - datetime.strptime(event['date'], '%Y-%m-%d')).days) > 7 for balance in historical_total_balance for event in FED_EVENTS):
+        if not transactions and all(abs(day - event_day) > 7 for day in balance_days for _, event_day in event_days):
             insights.append("No significant on-chain activity correlates with known FED events, suggesting BlackRock's crypto strategy is insulated from FED policy shifts.")
         return insights
     except Exception as e:
@@ -613,6 +873,10 @@ def main(start_date=None, end_date=None, symbol=None):
     logger.info("Starting blackrock.py")
     output_dir = user_log_dir("WhaleScope", "Cauco")
     output_data = {"type": "result", "timestamp": datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')}
+    # WAL (via open_db) keeps readers unblocked while the batched writers commit
+    conn = open_db(DB_PATH, check_same_thread=False)
+    executor = ThreadPoolExecutor(max_workers=PHASE_WORKERS)
+    raw_transactions = None
     
     try:
         if end_date is None:
@@ -624,11 +888,13 @@ def main(start_date=None, end_date=None, symbol=None):
         output_data["end_date"] = end_date
         output_data["symbol"] = symbol
 
-        init_db()
-        if not check_api_key(ARKHAM_API_KEY):
+        f_key = executor.submit(check_api_key, ARKHAM_API_KEY)
+        f_entity = executor.submit(fetch_blackrock_entity, ARKHAM_API_KEY)
+        init_db(conn)
+        if not f_key.result():
             raise ValueError("Invalid API key")
         
-        entity_data = fetch_blackrock_entity(ARKHAM_API_KEY)
+        entity_data = f_entity.result()
         if not entity_data:
             raise ValueError("Failed to fetch BlackRock entity data")
         
@@ -637,81 +903,68 @@ def main(start_date=None, end_date=None, symbol=None):
         tags = entity_data.get('populatedTags', [{"id": "fund", "label": "Fund"}])
         output_data["profile"] = {"name": entity_name, "tags": [tag['label'] for tag in tags]}
         
-        api_balances = fetch_arkham_balances(ARKHAM_API_KEY, entity_id)
+        # Balances and transaction pages download while the database phases run
+        f_balances = executor.submit(fetch_arkham_balances, ARKHAM_API_KEY, entity_id)
+        raw_transactions = prefetch(executor, iter_blackrock_transactions(ARKHAM_API_KEY, entity_id, start_date, end_date, symbol))
+        api_balances = f_balances.result()
         if not api_balances:
             logger.warning("No balances fetched; proceeding with empty balances")
         output_data["balances"] = api_balances
-        save_intermediate_output(output_dir, output_data, "blackrock_balances.json")
+        emit_section(output_dir, output_data, reset=True)
         
-        wallet_data = update_wallets(entity_id, api_balances)
+        wallet_data = update_wallets(conn, entity_id, api_balances)
         output_data["wallet_data"] = wallet_data
         
         # Aggregate balances by token
-        holdings_by_chain = {}
-        aggregated_balances = {}
-        for balance in api_balances:
-            token = balance.get('symbol', '').upper()
-            balance_amount = float(balance.get('balance', 0))
-            balance_usd = float(balance.get('usd', 0))
-            if token in aggregated_balances:
-                aggregated_balances[token]['balance'] += balance_amount
-                aggregated_balances[token]['usd'] += balance_usd
-            else:
-                aggregated_balances[token] = {'balance': balance_amount, 'usd': balance_usd}
-            if token in ['BTC', 'ETH', 'USDC']:
-                price = round(balance_usd / balance_amount, 2) if balance_amount > 0 else 1.0 if token == 'USDC' else 0.0
-                holdings_by_chain[token] = {
-                    'balance': aggregated_balances[token]['balance'],
-                    'balance_usd': aggregated_balances[token]['usd'],
-                    'price': price
-                }
-        # Initialize empty holdings if none exist
-        for token in ['BTC', 'ETH', 'USDC']:
-            if token not in holdings_by_chain:
-                holdings_by_chain[token] = {'balance': 0.0, 'balance_usd': 0.0, 'price': 1.0 if token == 'USDC' else 0.0}
+        aggregated_balances = aggregate_balances(api_balances)
+        tracked = aggregated_balances.reindex(TRACKED_TOKENS)
+        # Tokens without any balance row: zero holdings, USDC priced at 1.0
+        absent = tracked['balance'].isna().to_numpy()
+        tracked[['balance', 'usd']] = tracked[['balance', 'usd']].fillna(0.0)
+        prices = np.where(absent, np.where(tracked.index == 'USDC', 1.0, 0.0), tracked['price'].to_numpy())
+        holdings_by_chain = {
+            token: {'balance': balance, 'balance_usd': usd, 'price': price}
+            for token, balance, usd, price in zip(tracked.index, tracked['balance'].tolist(), tracked['usd'].tolist(), prices.tolist())
+        }
         output_data["holdings_by_chain"] = holdings_by_chain
-        save_intermediate_output(output_dir, output_data, "blackrock_holdings.json")
+        emit_section(output_dir, {"wallet_data": wallet_data, "holdings_by_chain": holdings_by_chain})
         
         # Filter and aggregate balances for historical data
+        present = aggregated_balances[aggregated_balances.index.isin(TRACKED_TOKENS)]
         balances = [
-            {'symbol': token, 'balance': agg['balance'], 'usd': agg['usd']}
-            for token, agg in aggregated_balances.items()
-            if token in ['BTC', 'ETH', 'USDC']
+            {'symbol': token, 'balance': balance, 'usd': usd}
+            for token, balance, usd in zip(present.index, present['balance'].tolist(), present['usd'].tolist())
         ]
-        historical_prices = derive_prices_from_balances(api_balances, start_date, end_date)
+        historical_prices = derive_prices_from_balances(conn, api_balances, start_date, end_date)
         output_data["historical_prices"] = historical_prices
-        save_intermediate_output(output_dir, output_data, "blackrock_prices.json")
+        price_by_ord = index_prices_by_ordinal(historical_prices)
+        emit_section(output_dir, {"historical_prices": historical_prices})
         
-        balances = ensure_historical_wallet_data(entity_id, start_date, end_date, balances, historical_prices)
+        balances = ensure_historical_wallet_data(conn, entity_id, start_date, end_date, balances, price_by_ord)
         output_data["balances"] = balances
         
-        # Fetch transactions
-        raw_transactions = fetch_arkham_transactions(ARKHAM_API_KEY, entity_id, start_date, end_date, symbol)
-        if not raw_transactions:
-            logger.info("No entity transactions found, attempting address-based queries")
-            if addresses := fetch_blackrock_addresses(ARKHAM_API_KEY, entity_id):
-                for address in addresses[:20]:
-                    raw_transactions.extend(fetch_address_transactions(ARKHAM_API_KEY, address, start_date, end_date, symbol))
-                    time.sleep(1)
-            else:
-                logger.warning("No addresses found for entity blackrock, likely custodial holdings")
-        
-        transactions = process_transactions(raw_transactions, historical_prices, symbol)
+        # Stream the prefetched transactions into the database
+        exchange_usage = empty_exchange_usage()
+        transactions = process_transactions(conn, raw_transactions, price_by_ord, symbol, exchange_usage)
         output_data["transactions"] = transactions
-        save_intermediate_output(output_dir, output_data, "blackrock_transactions.json")
+        emit_section(output_dir, {"balances": balances, "transactions": transactions})
         
-        exchange_usage = process_exchange_usage(raw_transactions, entity_id)
+        logger.info(f"Exchange usage: Deposits ${exchange_usage['deposits']['total']:,.2f}, Withdrawals ${exchange_usage['withdrawals']['total']:,.2f}")
         output_data["exchange_usage"] = exchange_usage
         
-        historical_balances = fetch_historical_balances(entity_id, start_date, end_date)
+        historical_balances = fetch_historical_balances(conn, entity_id, start_date, end_date)
         output_data["historical_balances"] = historical_balances
         
-        historical_total_balance = fetch_historical_total_balance(entity_id, start_date, end_date)
+        historical_total_balance = fetch_historical_total_balance(conn, entity_id, start_date, end_date)
         output_data["historical_total_balance"] = historical_total_balance
-        save_intermediate_output(output_dir, output_data, "blackrock_historical.json")
+        emit_section(output_dir, {
+            "exchange_usage": exchange_usage,
+            "historical_balances": historical_balances,
+            "historical_total_balance": historical_total_balance,
+        })
         
         # Safely calculate total balance
-        total_balance_usd = sum(holdings_by_chain[token].get('balance_usd', 0) for token in holdings_by_chain)
+        total_balance_usd = float(tracked['usd'].sum())
         output_data["profile"]["total_balance_usd"] = total_balance_usd
         
         generate_visualizations(historical_balances, historical_total_balance, transactions, PLOT_DIR)
@@ -720,12 +973,13 @@ def main(start_date=None, end_date=None, symbol=None):
         output_data["insights"] = insights
         
         output_file = os.path.join(output_dir, "blackrock_output.json")
-        json_output = json.dumps(output_data, allow_nan=False)
-        print(json_output)
+        # orjson writes NaN/Infinity as null, so the payload is always strict JSON
+        json_output = orjson.dumps(output_data, option=orjson.OPT_NON_STR_KEYS)
+        sys.stdout.write(json_output.decode() + "\n")
         sys.stdout.flush()
         
-        with open(output_file, 'w') as f:
-            json.dump(output_data, f, indent=2)
+        with open(output_file, 'wb') as f:
+            f.write(orjson.dumps(output_data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
         logger.info(f"Data saved to {output_file}")
         
         return output_data
@@ -737,6 +991,11 @@ def main(start_date=None, end_date=None, symbol=None):
         print(json.dumps(error))
         sys.stdout.flush()
         raise
+    finally:
+        if raw_transactions is not None:
+            raw_transactions.close()  # Unblock the prefetch thread if it was never drained
+        executor.shutdown(wait=False, cancel_futures=True)
+        conn.close()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="BlackRock data fetcher")
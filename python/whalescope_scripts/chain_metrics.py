@@ -4,7 +4,9 @@ chain_metrics.py
 Fetch chain metrics from Allium (via run-async) and optionally add GPT insights.
 """
 
-import os, sys, json, argparse, requests, time
+import os, sys, json, argparse, time
+import httpx
+import orjson
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 
@@ -15,6 +17,11 @@ OPENAI_KEY = os.getenv("OPENAI_API_KEY")
 
 QUERY_ID = "6zhLhumgFL3zQlP1W6B9"
 
+# Poll backoff: start fast, double up to a plateau, give up at the deadline
+POLL_INITIAL_DELAY = 0.1
+POLL_MAX_DELAY = 1.5
+POLL_TIMEOUT = 60
+
 if not ALLIUM_KEY:
     print(json.dumps({
         "type": "marketbrain",
@@ -25,18 +32,20 @@ if not ALLIUM_KEY:
     }, indent=2))
     sys.exit(1)
 
-session = requests.Session()
-session.headers.update({
-    "User-Agent": "WhaleScope/1.0",
-    "X-API-KEY": ALLIUM_KEY
-})
+# One HTTP/2 connection carries the launch POST and every poll GET
+client = httpx.Client(
+    http2=True,
+    headers={"User-Agent": "WhaleScope/1.0", "X-API-KEY": ALLIUM_KEY},
+    timeout=30.0,
+    limits=httpx.Limits(max_keepalive_connections=8),
+)
 
 # ================== HELPERS ==================
 def fetch_query_results(limit):
     """Fetch results from Allium using run-async with a fixed query_id."""
     # 1. Lanzar el query
     url = f"https://api.allium.so/api/v1/developer/queries/{QUERY_ID}/run-async"
-    resp = session.post(url, json={"parameters": {}}, timeout=30)
+    resp = client.post(url, json={"parameters": {}})
     resp.raise_for_status()
     run = resp.json()
     run_id = run.get("id")
@@ -45,8 +54,10 @@ def fetch_query_results(limit):
 
     # 2. Poll to success
     url = f"https://api.allium.so/api/v1/developer/query-results/{run_id}"
-    for _ in range(30):  # ~30s max
-        r = session.get(url, timeout=30)
+    delay = POLL_INITIAL_DELAY
+    deadline = time.monotonic() + POLL_TIMEOUT
+    while time.monotonic() < deadline:
+        r = client.get(url)
         r.raise_for_status()
         data = r.json()
         if data.get("status") == "success":
@@ -54,7 +65,8 @@ def fetch_query_results(limit):
             return rows[:limit]
         elif data.get("status") in ("failed", "error"):
             raise RuntimeError(f"Query failed: {data}")
-        time.sleep(1)
+        time.sleep(delay)
+        delay = min(delay * 2, POLL_MAX_DELAY)
 
     raise TimeoutError("Query did not finish in time")
 
@@ -110,7 +122,7 @@ def main():
         if args.insights == "gpt" and rows:
             payload["insights"] = get_gpt_insights(rows)
 
-        print(json.dumps(payload if args.api else rows, indent=2, default=str))
+        print(orjson.dumps(payload if args.api else rows, default=str, option=orjson.OPT_INDENT_2).decode())
 
     except Exception as e:
         print(json.dumps({
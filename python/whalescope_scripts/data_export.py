@@ -9,10 +9,22 @@ from datetime import datetime
 # ====== CONFIG ======
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, "crypto_data.db")
+CHUNK_SIZE = 50_000
 
-def export_to_csv(filters=None):
-    """Export data from SQLite to CSV with optional filters."""
+def ensure_indexes():
+    """Create the indexes used by the export filters if they are missing."""
     conn = sqlite3.connect(DB_PATH)
+    try:
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_staking_sym_date ON staking(symbol, date)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_staking_exchange ON staking(exchange)")
+        conn.commit()
+    finally:
+        conn.close()
+
+def export_to_csv(filters=None):
+    """Export data from SQLite to CSV with optional filters, streaming rows in chunks."""
+    ensure_indexes()
+    conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
     
     query = "SELECT * FROM staking WHERE 1=1"
     params = []
@@ -37,15 +49,21 @@ def export_to_csv(filters=None):
             query += " AND exchange IN ({})".format(",".join(["?"] * len(filters["exchanges"])))
             params.extend(filters["exchanges"])
     
-    df = pd.read_sql_query(query, conn, params=params)
-    conn.close()
+    output_path = f"marketbrain_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    written = 0
+    try:
+        for chunk in pd.read_sql_query(query, conn, params=params, chunksize=CHUNK_SIZE):
+            if chunk.empty:
+                continue
+            chunk.to_csv(output_path, index=False, mode='w' if written == 0 else 'a', header=written == 0)
+            written += len(chunk)
+    finally:
+        conn.close()
     
-    if df.empty:
+    if written == 0:
         print("No data found for the specified filters")
         return None
     
-    output_path = f"marketbrain_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-    df.to_csv(output_path, index=False)
     print(f"Data exported to {output_path}")
     return output_path
 
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+# db_utils.py
+# Shared SQLite connection helper for the whalescope/marketbrain databases
+
+import sqlite3
+
+# Per-connection settings: fewer fsyncs per commit, temp tables in RAM,
+# memory-mapped reads and a 64 MB page cache. The busy timeout is left to
+# sqlite3.connect's `timeout` (5 s by default), so callers can raise it
+DB_PRAGMAS = """
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA mmap_size=268435456;
+    PRAGMA cache_size=-65536;
+"""
+
+
+def open_db(path, **kwargs):
+    """Connect to a SQLite database with WAL and the DB_PRAGMAS settings applied.
+
+    journal_mode is stored in the database file, so it is only switched when the
+    file is not already in WAL; readers then no longer block behind a writer.
+    """
+    conn = sqlite3.connect(path, **kwargs)
+    if conn.execute("PRAGMA journal_mode").fetchone()[0].lower() != "wal":
+        conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(DB_PRAGMAS)
+    return conn
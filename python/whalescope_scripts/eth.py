@@ -9,7 +9,6 @@
 # - Outputs ONLY JSON for Electron integration
 # ============================================================
 
-import sqlite3
 import sys
 import json
 import logging
@@ -17,14 +16,26 @@ import os
 import requests
 import time
 import random
-import pandas as pd
-import numpy as np
+import re
+import threading
 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 import argparse
-import hashlib
+import orjson
 from appdirs import user_log_dir
-from openai import OpenAI
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import TYPE_CHECKING
+
+from db_utils import open_db
+
+# pandas, numpy and openai are imported inside the functions that use them,
+# so spawning this script does not pay their import cost up front
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
 
 # ============================================================
 # CONFIGURATION
@@ -85,43 +96,108 @@ logger = logging.getLogger(__name__)
 # HELPERS (cache, retry, timestamps)
 # ============================================================
 CACHE_DIR = "cache"
+CACHE_DB = os.path.join(CACHE_DIR, "http_cache.db")
 CACHE_DURATION = 300  # 5 minutes
+CACHE_MAX_AGE = 86400  # rows older than a day are swept when the cache opens
 if not os.path.exists(CACHE_DIR):
     os.makedirs(CACHE_DIR)
 
-def get_cache_key(key: str):
-    return os.path.join(CACHE_DIR, hashlib.md5(key.encode()).hexdigest() + ".json")
+STAKING_DB = os.path.abspath(os.path.join(HERE, "..", "..", "whalescope.db"))
+
+_staking_conn = None
+_staking_lock = threading.Lock()
+
+def get_staking_conn():
+    """Open whalescope.db once per process; callers hold _staking_lock while using it."""
+    global _staking_conn
+    if _staking_conn is None:
+        # WAL (via open_db) lets build_staking_json read while save_staking_to_db writes
+        _staking_conn = open_db(STAKING_DB, check_same_thread=False)
+    return _staking_conn
+
+_cache_conn = None
+# fetch_eth_data hits the cache from worker threads; one lock serialises the connection
+_cache_lock = threading.Lock()
+
+def get_cache_conn():
+    """Open the shared response cache (one SQLite KV table) on first use."""
+    global _cache_conn
+    if _cache_conn is None:
+        _cache_conn = open_db(CACHE_DB, isolation_level=None, check_same_thread=False)
+        _cache_conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, ts REAL NOT NULL, blob BLOB NOT NULL)")
+        _cache_conn.execute("DELETE FROM cache WHERE ts < ?", (time.time() - CACHE_MAX_AGE,))
+    return _cache_conn
 
 def get_cached_response(key: str):
-    cache_file = get_cache_key(key)
-    if os.path.exists(cache_file):
-        try:
-            with open(cache_file, "r") as f:
-                cached = json.load(f)
-            if time.time() - cached["timestamp"] < CACHE_DURATION:
-                return cached["data"]
-        except Exception:
-            return None
-    return None
+    """Return (data, age_seconds) for a cached key whatever its age, or (None, None)."""
+    try:
+        with _cache_lock:
+            row = get_cache_conn().execute("SELECT ts, blob FROM cache WHERE key = ?", (key,)).fetchone()
+        if row:
+            return orjson.loads(row[1]), time.time() - row[0]
+    except Exception:
+        pass
+    return None, None
 
 def cache_response(key: str, data):
-    cache_file = get_cache_key(key)
-    with open(cache_file, "w") as f:
-        json.dump({"timestamp": time.time(), "data": data}, f, indent=2)
+    blob = orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+    with _cache_lock:
+        get_cache_conn().execute(
+            "INSERT OR REPLACE INTO cache (key, ts, blob) VALUES (?, ?, ?)",
+            (key, time.time(), blob)
+        )
 
-def make_request_with_retry(url, headers=None, params=None, max_retries=3):
+# One pooled keep-alive session for Binance, CoinGecko and Allium. Server errors are
+# retried in urllib3; 429s are still backed off in make_request_with_retry
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=8, pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504], raise_on_status=False),
+))
+
+def make_request_with_retry(url, headers=None, params=None, max_retries=3, allow_stale=True):
     cache_key = url + (json.dumps(params, sort_keys=True) if params else "")
-    cached = get_cached_response(cache_key)
-    if cached is not None:
+    cached, age = get_cached_response(cache_key)
+    if cached is not None and age < CACHE_DURATION:
         return cached
 
+    # Revalidate an expired entry: if the server sent ETag/Last-Modified with it,
+    # a 304 lets us keep the cached body without downloading or parsing it again
+    validators = get_cached_response(f"validators:{cache_key}")[0] if cached is not None else None
+    if validators:
+        headers = {**(headers or {}), **validators}
+
+    r = _request_with_retry(url, headers, params, max_retries)
+    if r is not None and r.status_code == 304 and cached is not None:
+        cache_response(cache_key, cached)
+        return cached
+    try:
+        data = r.json() if r is not None and r.status_code == 200 else None
+    except ValueError as e:
+        print(f"[Request error] Invalid JSON from {url}: {e}", file=sys.stderr)
+        data = None
+    if data is not None:
+        cache_response(cache_key, data)
+        fresh = {
+            name: r.headers[header]
+            for name, header in (("If-None-Match", "ETag"), ("If-Modified-Since", "Last-Modified"))
+            if header in r.headers
+        }
+        if fresh:
+            cache_response(f"validators:{cache_key}", fresh)
+        return data
+    if allow_stale and cached is not None:
+        print(f"[Cache] Upstream failed, serving {int(age)}s-old response for {url}", file=sys.stderr)
+        return cached
+    return None
+
+def _request_with_retry(url, headers, params, max_retries):
+    """GET with 429/network backoff; returns the 200 or 304 response, else None."""
     for attempt in range(max_retries):
         try:
-            r = requests.get(url, headers=headers, params=params, timeout=15)
-            if r.status_code == 200:
-                data = r.json()
-                cache_response(cache_key, data)
-                return data
+            r = SESSION.get(url, headers=headers, params=params, timeout=15)
+            if r.status_code in (200, 304):
+                return r
             elif r.status_code == 429:
                 time.sleep(2 ** attempt + random.uniform(0, 1))
             else:
@@ -134,6 +210,67 @@ def make_request_with_retry(url, headers=None, params=None, max_retries=3):
             time.sleep(2 ** attempt + random.uniform(0, 1))
     return None
 
+# Allium poll backoff: start fast, grow to a plateau, give up at the budget
+ALLIUM_POLL_INITIAL_DELAY = 0.5
+ALLIUM_POLL_MAX_DELAY = 8.0
+ALLIUM_POLL_TIMEOUT = 30
+
+def retry_after_seconds(resp, default):
+    """Delay requested by a Retry-After header (in seconds), else the default."""
+    try:
+        return max(float(resp.headers.get("Retry-After", default)), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+def wait_for_allium_run(status_url, headers):
+    """Poll an Allium query run until it succeeds; returns False if it fails or the budget is spent."""
+    delay = ALLIUM_POLL_INITIAL_DELAY
+    deadline = time.monotonic() + ALLIUM_POLL_TIMEOUT
+    while (remaining := deadline - time.monotonic()) > 0:
+        status_resp = SESSION.get(status_url, headers=headers, timeout=30)
+        status_resp.raise_for_status()
+        status = str(status_resp.json().get("status", "")).lower()
+        if status == "success":
+            return True
+        if status in ("failed", "error", "canceled"):
+            print(f"[ALLIUM] Query run ended with status {status}", file=sys.stderr)
+            return False
+        time.sleep(min(retry_after_seconds(status_resp, delay), remaining))
+        delay = min(delay * 1.7, ALLIUM_POLL_MAX_DELAY)
+    return False
+
+ALLIUM_EXPLORER_URL = "https://api.allium.so/api/v1/explorer"
+
+def run_allium_query(query_id, parameters, limit=10000):
+    """Run an Allium explorer query and return its result rows (None if the run did not succeed).
+
+    Only completed runs are cached; results are kept in the response cache for CACHE_DURATION, keyed on query and parameters.
+    """
+    cache_key = f"allium:{query_id}:{json.dumps(parameters, sort_keys=True)}:{limit}"
+    cached, age = get_cached_response(cache_key)
+    if cached is not None and age < CACHE_DURATION:
+        return cached
+
+    headers = {"X-API-KEY": ALLIUM_API_KEY, "Content-Type": "application/json"}
+    run_url = f"{ALLIUM_EXPLORER_URL}/queries/{query_id}/run-async"
+    payload = {"parameters": parameters, "run_config": {"limit": limit}}
+    run_resp = SESSION.post(run_url, headers=headers, json=payload, timeout=60)
+    run_resp.raise_for_status()
+    run_id = run_resp.json().get("run_id")
+    if not run_id:
+        print("[ALLIUM] No run_id returned from Allium", file=sys.stderr)
+        return None
+
+    if not wait_for_allium_run(f"{ALLIUM_EXPLORER_URL}/query-runs/{run_id}", headers):
+        print(f"[ALLIUM] Run {run_id} did not complete; results not fetched", file=sys.stderr)
+        return None
+
+    results_resp = SESSION.get(f"{ALLIUM_EXPLORER_URL}/query-runs/{run_id}/results", headers=headers, timeout=60)
+    results_resp.raise_for_status()
+    data = results_resp.json().get("data", [])
+    cache_response(cache_key, data)
+    return data
+
 def to_binance_timestamps(start_date, end_date):
     start_dt = datetime.strptime(start_date, "%Y-%m-%d")
     end_dt = datetime.strptime(end_date, "%Y-%m-%d")
@@ -154,11 +291,38 @@ def fetch_coin_gecko_data():
 # ============================================================
 # STAKING: BUILD SNAPSHOT + TIME SERIES
 # ============================================================
+CATEGORY_MAP = {
+    "Liquid Staking Participants": ["lido", "rocket"],
+    "CEX Participants": ["binance", "coinbase", "kraken", "okx", "huobi"],
+    "Restaking Participants": ["eigen"],
+    "Staking Pools Participants": []
+}
+
+DEFAULT_CATEGORY = "Staking Pools Participants"
+# One alternative per category, tried in CATEGORY_MAP order; each lookahead scans the
+# whole name for any of its keywords, so the first matching category wins in one match().
+_CATEGORY_GROUPS = [cat for cat, kws in CATEGORY_MAP.items() if kws]
+CATEGORY_RE = re.compile(
+    "|".join(
+        f"(?P<c{i}>(?=.*(?:{'|'.join(map(re.escape, CATEGORY_MAP[cat]))})))"
+        for i, cat in enumerate(_CATEGORY_GROUPS)
+    ),
+    re.IGNORECASE | re.DOTALL,
+)
+
+def categorize_entity(entity_name) -> str:
+    m = CATEGORY_RE.match(entity_name or "")
+    return _CATEGORY_GROUPS[int(m.lastgroup[1:])] if m else DEFAULT_CATEGORY
+
+def categorize_entities(names: "pd.Series") -> "np.ndarray":
+    """Map entity names to CATEGORY_MAP categories (first matching keyword set wins)."""
+    return names.astype(object).where(names.notna(), "").astype(str).map(categorize_entity).to_numpy()
 
 def build_staking_json(start_date, end_date):
     """Read staking + entities rows from SQLite and build JSON snapshot + timeseries + extra sections"""
     from datetime import datetime
-    import sqlite3, os
+    import numpy as np
+    import pandas as pd
 
     # --- Detect date range ---
     d0 = datetime.fromisoformat(start_date)
@@ -176,8 +340,7 @@ def build_staking_json(start_date, end_date):
         granularity = "month"
         date_expr = "strftime('%Y-%m', activity_date)"  # año-mes
 
-    db_path = os.path.abspath(os.path.join(HERE, "..", "..", "whalescope.db"))
-    with sqlite3.connect(db_path) as conn:
+    with _staking_lock, get_staking_conn() as conn:
         cur = conn.cursor()
 
         # --- Read activity with resample ---
@@ -198,13 +361,32 @@ def build_staking_json(start_date, end_date):
         rows = cur.fetchall()
 
         # --- Entities (all records within the range) ---
-        cur.execute("""
+        ent = pd.read_sql_query("""
             SELECT activity_date, entity, staked, share
             FROM eth_entities
             WHERE activity_date BETWEEN ? AND ?
             ORDER BY activity_date ASC
+        """, conn, params=(start_date, end_date))
+
+        # --- Top-10 entities + "Others" on the latest snapshot, ranked in SQL ---
+        cur.execute("CREATE INDEX IF NOT EXISTS ix_eth_entities_date ON eth_entities(activity_date, staked DESC)")
+        cur.execute("""
+            WITH latest AS (
+                SELECT MAX(activity_date) AS d
+                FROM eth_entities
+                WHERE activity_date BETWEEN ? AND ?
+            ), ranked AS (
+                SELECT entity, COALESCE(staked, 0) AS staked,
+                       ROW_NUMBER() OVER (ORDER BY COALESCE(staked, 0) DESC, entity) AS rn
+                FROM eth_entities, latest
+                WHERE activity_date = latest.d
+            )
+            SELECT entity, staked, rn FROM ranked WHERE rn <= 10
+            UNION ALL
+            SELECT 'Others', SUM(staked), 11 FROM ranked WHERE rn > 10
+            ORDER BY rn
         """, (start_date, end_date))
-        entity_rows = cur.fetchall()
+        breakdown_rows = cur.fetchall()
 
     if not rows:
         return {}
@@ -240,86 +422,47 @@ def build_staking_json(start_date, end_date):
     }
 
     # === Entities (most recent snapshot only) ===
-    entities = [
-        {
-            "activity_date": er[0],
-            "entity": er[1],
-            "staked": float(er[2]) if er[2] is not None else 0.0,
-            "share": float(er[3]) if er[3] is not None else None,
-        }
-        for er in entity_rows
-    ]
+    ent["staked"] = pd.to_numeric(ent["staked"], errors="coerce").fillna(0.0)
+    ent["share"] = pd.to_numeric(ent["share"], errors="coerce")
+    entities = ent.astype(object).where(ent.notna(), None).to_dict("records")
 
     breakdown_labels, breakdown_values = [], []
     entity_dates = []
-    if entities:
-        entity_dates = sorted({e["activity_date"] for e in entities})
-        latest_entities_date = entity_dates[-1]
-
-        # Only most recent snapshot
-        filtered = [e for e in entities if e["activity_date"] == latest_entities_date]
-
-        # Sort by stake and limit Top-10
-        sorted_entities = sorted(
-            [(e["entity"], float(e["staked"] or 0.0)) for e in filtered],
-            key=lambda x: x[1],
-            reverse=True
-        )
+    latest = ent.iloc[0:0]
+    if not ent.empty:
+        entity_dates = sorted(ent["activity_date"].unique().tolist())
+        latest = ent[ent["activity_date"] == entity_dates[-1]]
 
-        top_entities = sorted_entities[:10]
-        others_sum = sum(val for _, val in sorted_entities[10:])
-
-        breakdown_labels = [lbl for lbl, _ in top_entities]
-        breakdown_values = [val for _, val in top_entities]
-
-        if others_sum > 0:
-            breakdown_labels.append("Others")
-            breakdown_values.append(others_sum)
+        for label, value, rn in breakdown_rows:
+            if rn > 10 and not (value or 0) > 0:
+                continue
+            breakdown_labels.append(label)
+            breakdown_values.append(float(value))
 
     # === Market Share (only last 30 dates to avoid JSON overload) ===
     marketshare = {"dates": entity_dates[-30:], "series": []}
-    if entities and entity_dates:
-        totals_by_date = {}
-        for e in entities:
-            d = e["activity_date"]
-            totals_by_date[d] = totals_by_date.get(d, 0.0) + float(e["staked"] or 0.0)
-
-        series_map = {}
-        for e in entities:
-            name = e["entity"]
-            if name not in series_map:
-                series_map[name] = {d: 0.0 for d in entity_dates[-30:]}
-            if e["activity_date"] in series_map[name]:
-                total = totals_by_date.get(e["activity_date"], 0.0)
-                pct = (float(e.get("staked") or 0.0) / total * 100.0) if total > 0 else 0.0
-                series_map[name][e["activity_date"]] = pct
-
+    if entity_dates:
+        # Only the charted window is pivoted; entities absent from it still get a zero row
+        window = ent[ent["activity_date"] >= entity_dates[-30:][0]]
+        # Per-date totals as one bincount over factorized dates, then a masked divide
+        date_codes, _ = pd.factorize(window["activity_date"])
+        staked = window["staked"].to_numpy(dtype=np.float64)
+        totals = np.bincount(date_codes, weights=staked)[date_codes]
+        pct = np.divide(staked, totals, out=np.zeros_like(staked), where=totals > 0) * 100.0
+        wide = window.assign(pct=pct).pivot_table(
+            index="entity", columns="activity_date", values="pct",
+            aggfunc="last", fill_value=0.0, sort=False
+        ).reindex(index=ent["entity"].dropna().unique(), columns=entity_dates[-30:], fill_value=0.0)
         marketshare["series"] = [
-            {"name": name, "values": [series_map[name][d] for d in entity_dates[-30:]]}
-            for name in series_map
+            {"name": name, "values": values}
+            for name, values in zip(wide.index, wide.to_numpy().tolist())
         ]
 
     # === Categorization ===
-    CATEGORY_MAP = {
-        "Liquid Staking Participants": ["lido", "rocket"],
-        "CEX Participants": ["binance", "coinbase", "kraken", "okx", "huobi"],
-        "Restaking Participants": ["eigen"],
-        "Staking Pools Participants": []
-    }
-
-    def categorize_entity(entity_name: str) -> str:
-        name = (entity_name or "").lower()
-        for category, keywords in CATEGORY_MAP.items():
-            if any(kw in name for kw in keywords):
-                return category
-        return "Staking Pools Participants"
-
     breakdown_by_category = {}
-    if entities:
-        latest_entities = [e for e in entities if e["activity_date"] == entity_dates[-1]]
-        for e in latest_entities:
-            cat = categorize_entity(e["entity"])
-            breakdown_by_category[cat] = breakdown_by_category.get(cat, 0.0) + (e["staked"] or 0.0)
+    if not latest.empty:
+        categories = categorize_entities(latest["entity"])
+        breakdown_by_category = latest["staked"].groupby(categories, sort=False).sum().to_dict()
         for cat in CATEGORY_MAP.keys():
             breakdown_by_category.setdefault(cat, 0.0)
 
@@ -348,6 +491,15 @@ def build_staking_json(start_date, end_date):
 # ALLIUM (Staking replacement for ETH)
 # ============================================================
 
+# Numeric columns copied from each Allium staking row, in output order
+ALLIUM_STAKING_FLOAT_FIELDS = (
+    "token_price_at_date", "token_price_current",
+    "total_stake", "active_stake", "active_stake_usd", "circulating_supply_usd",
+    "total_stake_usd_current", "active_stake_usd_current",
+    "pct_total_stake_active", "pct_circulating_staked_est",
+    "daily_net_stake", "deposits_est_eth", "withdrawals_est_eth",
+)
+
 def fetch_allium_staking(start_date=None, end_date=None, query_id=None):
     """
     Fetch ETH staking activity from Allium.
@@ -368,63 +520,25 @@ def fetch_allium_staking(start_date=None, end_date=None, query_id=None):
         print("[ALLIUM] Missing API key or query ID", file=sys.stderr)
         return []
 
-    base_url = "https://api.allium.so/api/v1/explorer"
-    headers = {"X-API-KEY": ALLIUM_API_KEY, "Content-Type": "application/json"}
-
     try:
-        # 2. Launch query async
-        run_url = f"{base_url}/queries/{query_to_use}/run-async"
-        payload = {
-            "parameters": {"start_date": start_date, "end_date": end_date},
-            "run_config": {"limit": 10000}
-        }
-        run_resp = requests.post(run_url, headers=headers, json=payload, timeout=60)
-        run_resp.raise_for_status()
-        run_id = run_resp.json().get("run_id")
-        if not run_id:
-            print("[ALLIUM] No run_id returned from Allium", file=sys.stderr)
+        # 2-4. Launch, poll and fetch the query run
+        data = run_allium_query(query_to_use, {"start_date": start_date, "end_date": end_date})
+        if data is None:
             return []
-
-        # 3. Poll query status until it's complete
-        status_url = f"{base_url}/query-runs/{run_id}"
-        for _ in range(30):  # wait up to ~30 seconds
-            status_resp = requests.get(status_url, headers=headers, timeout=30)
-            status_resp.raise_for_status()
-            if status_resp.json().get("status") == "success":
-                break
-            time.sleep(1)
-
-        # 4. Fetch query results
-        results_url = f"{base_url}/query-runs/{run_id}/results"
-        results_resp = requests.get(results_url, headers=headers, timeout=60)
-        results_resp.raise_for_status()
-        data = results_resp.json().get("data", [])
         if not isinstance(data, list):
             print("[ALLIUM] Invalid response structure", file=sys.stderr)
             return []
 
         # 5. Normalize ETH rows into consistent format (respecting Allium precomputed fields)
-        normalized = []
-        for row in data:
-            chain_raw = str(row.get("chain_raw", row.get("chain", ""))).lower()
-            if chain_raw in ("eth", "ethereum"):
-                normalized.append({
-                    "activity_date": str(row.get("activity_date")).split("T")[0],
-                    "chain": "ethereum",
-                    "token_price_at_date": float(row.get("token_price_at_date", 0) or 0),
-                    "token_price_current": float(row.get("token_price_current", 0) or 0),
-                    "total_stake": float(row.get("total_stake", 0) or 0),
-                    "active_stake": float(row.get("active_stake", 0) or 0),
-                    "active_stake_usd": float(row.get("active_stake_usd", 0) or 0),
-                    "circulating_supply_usd": float(row.get("circulating_supply_usd", 0) or 0),
-                    "total_stake_usd_current": float(row.get("total_stake_usd_current", 0) or 0),
-                    "active_stake_usd_current": float(row.get("active_stake_usd_current", 0) or 0),
-                    "pct_total_stake_active": float(row.get("pct_total_stake_active", 0) or 0),
-                    "pct_circulating_staked_est": float(row.get("pct_circulating_staked_est", 0) or 0),
-                    "daily_net_stake": float(row.get("daily_net_stake", 0) or 0),
-                    "deposits_est_eth": float(row.get("deposits_est_eth", 0) or 0),
-                    "withdrawals_est_eth": float(row.get("withdrawals_est_eth", 0) or 0),
-                })
+        normalized = [
+            {
+                "activity_date": str(row.get("activity_date")).split("T")[0],
+                "chain": "ethereum",
+                **{field: float(row.get(field) or 0) for field in ALLIUM_STAKING_FLOAT_FIELDS},
+            }
+            for row in data
+            if str(row.get("chain_raw", row.get("chain", ""))).lower() in ("eth", "ethereum")
+        ]
 
         # 6. Sort chronologically
         normalized_sorted = sorted(normalized, key=lambda x: x["activity_date"])
@@ -439,39 +553,32 @@ def fetch_allium_staking(start_date=None, end_date=None, query_id=None):
 # ============================================================
 # SAVE TO SQLITE
 # ============================================================
+# Prepared once and reused by every executemany batch
+ETH_ACTIVITY_COLUMNS = ("activity_date", "chain") + ALLIUM_STAKING_FLOAT_FIELDS
+SQL_INSERT_ETH_ACTIVITY = (
+    f"INSERT OR REPLACE INTO eth_activity ({', '.join(ETH_ACTIVITY_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(ETH_ACTIVITY_COLUMNS))})"
+)
+SQL_INSERT_ETH_ENTITY = """
+    INSERT OR REPLACE INTO eth_entities
+    (activity_date, entity, staked, share)
+    VALUES (?, ?, ?, ?)
+"""
+
 def save_staking_to_db(rows, entities=None):
     if not rows:
         return
     try:
-        db_path = os.path.abspath(os.path.join(HERE, "..", "..", "whalescope.db"))
-        with sqlite3.connect(db_path) as conn:
-            cur = conn.cursor()
-            for row in rows:
-                cur.execute("""
-                    INSERT OR REPLACE INTO eth_activity 
-                    (activity_date, chain, token_price_at_date, token_price_current,
-                     total_stake, active_stake, active_stake_usd, circulating_supply_usd,
-                     total_stake_usd_current, active_stake_usd_current,
-                     pct_total_stake_active, pct_circulating_staked_est,
-                     daily_net_stake, deposits_est_eth, withdrawals_est_eth)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    row.get("activity_date"), row.get("chain", "ethereum"),
-                    row.get("token_price_at_date"), row.get("token_price_current"),
-                    row.get("total_stake"), row.get("active_stake"),
-                    row.get("active_stake_usd"), row.get("circulating_supply_usd"),
-                    row.get("total_stake_usd_current"), row.get("active_stake_usd_current"),
-                    row.get("pct_total_stake_active"), row.get("pct_circulating_staked_est"),
-                    row.get("daily_net_stake"), row.get("deposits_est_eth"), row.get("withdrawals_est_eth"),
-                ))
-            if entities:
-                for e in entities:
-                    cur.execute("""
-                        INSERT OR REPLACE INTO eth_entities
-                        (activity_date, entity, staked, share)
-                        VALUES (?, ?, ?, ?)
-                    """, (e.get("activity_date"), e.get("entity"), e.get("staked"), e.get("share")))
-            conn.commit()
+        # Generators, so executemany binds straight from the normalized dicts
+        activity = (
+            (row.get("activity_date"), row.get("chain", "ethereum"), *map(row.get, ALLIUM_STAKING_FLOAT_FIELDS))
+            for row in rows
+        )
+        staked = ((e.get("activity_date"), e.get("entity"), e.get("staked"), e.get("share")) for e in entities or ())
+        # One transaction for both tables, so the fsync happens once
+        with _staking_lock, get_staking_conn() as conn:
+            conn.executemany(SQL_INSERT_ETH_ACTIVITY, activity)
+            conn.executemany(SQL_INSERT_ETH_ENTITY, staked)
     except Exception as e:
         print(f"[DB] Error: {e}", file=sys.stderr)
 
@@ -481,14 +588,29 @@ def save_staking_to_db(rows, entities=None):
 def generate_insights(context: dict):
     return {"insight": f"ETH price ${context.get('price')} (24h {context.get('24h_change')}%, 7d {context.get('7d_change')}%, 30d {context.get('30d_change')}%)", "source": "local"}
 
+def rows_to_markdown(rows):
+    """Render a list of dicts as a Markdown table (columns in first-seen order)."""
+    cols = list(dict.fromkeys(k for row in rows for k in row))
+    lines = ["| " + " | ".join(cols) + " |", "|" + "|".join("---" for _ in cols) + "|"]
+    lines.extend("| " + " | ".join(str(row.get(c, "")) for c in cols) + " |" for row in rows)
+    return "\n".join(lines)
+
+_openai_client = None
+
+def get_openai_client():
+    """Create the OpenAI client on first use and keep its connection pool for later calls."""
+    global _openai_client
+    if _openai_client is None:
+        from openai import OpenAI
+        _openai_client = OpenAI(api_key=OPENAI_API_KEY)
+    return _openai_client
+
 def get_gpt_insights(staking_rows, context: dict, model="gpt-4o-mini"):
     if not OPENAI_API_KEY:
         return {"insight": "⚠️ No OpenAI API key", "source": "local"}
     try:
-        df = pd.DataFrame(staking_rows)
-        text = df.tail(30).to_markdown(index=False)
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        resp = client.chat.completions.create(
+        text = rows_to_markdown(staking_rows[-30:])
+        resp = get_openai_client().chat.completions.create(
             model=model,
             messages=[{"role": "user", "content": f"Analyze ETH staking:\n{text}\n\nContext:\n{json.dumps(context, indent=2)}"}],
             max_tokens=900, temperature=0.6,
@@ -502,64 +624,89 @@ def get_gpt_insights(staking_rows, context: dict, model="gpt-4o-mini"):
 # ============================================================
 
 
-def detect_whale_flows_whalemap(df: pd.DataFrame, symbol: str = "ETH", lookback: int = 7):
+def detect_whale_flows_whalemap(df: "pd.DataFrame", symbol: str = "ETH", lookback: int = 7):
     """
     Detecta actividad de ballenas estilo 'Whalemap' (TradingView).
     Devuelve estructura compatible con renderer.js (input_usd/output_usd).
     """
+    import numpy as np
 
     if df.empty or "volume" not in df.columns or "close" not in df.columns:
         return []
 
-    df = df.copy()
-    df["sma_volume"] = df["volume"].rolling(window=lookback, min_periods=1).mean()
+    volume = df["volume"].to_numpy(dtype=np.float64)
+    sma_volume = df["volume"].rolling(window=lookback, min_periods=1).mean().to_numpy(dtype=np.float64)
 
-    # Flags (igual que TradingView)
-    df["f1"] = df["volume"] > df["sma_volume"] * 2.00
-    df["f2"] = df["volume"] > df["sma_volume"] * 1.75
-    df["f3"] = df["volume"] > df["sma_volume"] * 1.50
-    df["f4"] = df["volume"] > df["sma_volume"] * 1.25
-    df["f5"] = df["volume"] > df["sma_volume"] * 1.00
-
-    # Buyer vs Seller volume
-    df["buyer_vol"] = np.where(df["close"] > df["close"].shift(1), df["volume"], 0)
-    df["seller_vol"] = np.where(df["close"] < df["close"].shift(1), df["volume"], 0)
+    # Size tiers (igual que TradingView): first threshold crossed wins
+    size = np.select(
+        [volume > sma_volume * k for k in (2.00, 1.75, 1.50, 1.25, 1.00)],
+        [5, 4, 3, 2, 1], default=0
+    )
 
+    # Buyer vs Seller volume; the first bar has no previous close (NaN compares False)
+    close = df["close"].to_numpy(dtype=np.float64)
+    prev_close = np.concatenate(([np.nan], close[:-1]))
+    buyer_vol = np.where(close > prev_close, volume, 0)
+    seller_vol = np.where(close < prev_close, volume, 0)
+    buy = (buyer_vol == 0) & (size > 0)
+    sell = (seller_vol == 0) & (size > 0)
+
+    # Only flagged rows reach Python; each emits its buy signal before its sell
+    hits = np.flatnonzero(buy | sell)
+    timestamps = [str(d) for d in df["dates"].iloc[hits].tolist()]
     signals = []
-    for _, row in df.iterrows():
-        for side in ["buy", "sell"]:
-            if (side == "buy" and row["buyer_vol"] == 0) or (side == "sell" and row["seller_vol"] == 0):
-                size = 0
-                if row["f1"]: size = 5
-                elif row["f2"]: size = 4
-                elif row["f3"]: size = 3
-                elif row["f4"]: size = 2
-                elif row["f5"]: size = 1
-
-                if size > 0:
-                    signals.append({
-                        "timestamp": str(row["dates"]),
-                        "input_usd": float(row["volume"]) if side == "buy" else 0,
-                        "output_usd": float(row["volume"]) if side == "sell" else 0,
-                        "net_flow": float(row["volume"]) if side == "buy" else -float(row["volume"]),
-                        "status": side,
-                        "symbol": symbol
-                    })
+    for i, ts, vol in zip(hits.tolist(), timestamps, volume[hits].tolist()):
+        if buy[i]:
+            signals.append({"timestamp": ts, "input_usd": vol, "output_usd": 0, "net_flow": vol, "status": "buy", "symbol": symbol})
+        if sell[i]:
+            signals.append({"timestamp": ts, "input_usd": 0, "output_usd": vol, "net_flow": -vol, "status": "sell", "symbol": symbol})
 
     return signals
 
 # ============================================================
 # CACHE
 # ============================================================
-analysis_cache = {}
-def get_cached_analysis(key): return analysis_cache.get(key)
-def set_cached_analysis(key, value): analysis_cache[key] = value
+# In-process LRU of fetch_eth_data results, bounded in size and expiring with the HTTP cache
+ANALYSIS_CACHE_SIZE = 32
+analysis_cache = OrderedDict()
+
+# The fetcher is spawned once per request, so the in-process LRU alone rarely hits.
+# Results are also written to the SQLite response cache, which outlives the process.
+def get_cached_analysis(key):
+    entry = analysis_cache.get(key)
+    if entry is not None:
+        stored_at, value = entry
+        if time.time() - stored_at < CACHE_DURATION:
+            analysis_cache.move_to_end(key)
+            return value
+        del analysis_cache[key]
+
+    value, age = get_cached_response(f"analysis:{key}")
+    if value is None or age >= CACHE_DURATION:
+        return None
+    _remember_analysis(key, value, time.time() - age)
+    return value
+
+def set_cached_analysis(key, value):
+    _remember_analysis(key, value, time.time())
+    try:
+        cache_response(f"analysis:{key}", value)
+    except Exception as e:
+        print(f"[CACHE] Could not persist {key}: {e}", file=sys.stderr)
+
+def _remember_analysis(key, value, stored_at):
+    analysis_cache[key] = (stored_at, value)
+    analysis_cache.move_to_end(key)
+    while len(analysis_cache) > ANALYSIS_CACHE_SIZE:
+        analysis_cache.popitem(last=False)
 
 # ============================================================
 # CORE FUNCTION
 # ============================================================
 
 def fetch_eth_data(start_date=None, end_date=None):
+    import numpy as np
+    import pandas as pd
     if not end_date:
         end_date = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     if not start_date:
@@ -581,26 +728,42 @@ def fetch_eth_data(start_date=None, end_date=None):
         "endTime": end_ts,
         "limit": 1000
     }
-    hist = make_request_with_retry(url_klines, params=params) or []
-    price_history = {"dates": [], "open": [], "high": [], "low": [], "close": [], "volume": []}
-    for e in hist:
-        d = datetime.utcfromtimestamp(e[0] / 1000).strftime("%Y-%m-%d")
-        price_history["dates"].append(d)
-        price_history["open"].append(float(e[1]))
-        price_history["high"].append(float(e[2]))
-        price_history["low"].append(float(e[3]))
-        price_history["close"].append(float(e[4]))
-        price_history["volume"].append(float(e[5]))
-    df_price = pd.DataFrame(price_history)
+    # The four upstream calls are independent; run them together so the wait is the slowest one.
+    # The pool is not joined here: each response below is parsed as soon as its own future
+    # resolves, while the later ones are still in flight
+    ex = ThreadPoolExecutor(max_workers=4)
+    fut_klines = ex.submit(make_request_with_retry, url_klines, params=params)
+    fut_spot = ex.submit(make_request_with_retry, f"{BINANCE_API_URL}/api/v3/ticker/24hr", params={"symbol": "ETHUSDT"})
+    fut_gecko = ex.submit(fetch_coin_gecko_data)
+    fut_trades = ex.submit(
+        make_request_with_retry,
+        f"{BINANCE_API_URL}/api/v3/aggTrades",
+        params={"symbol": "ETHUSDT", "startTime": start_ts, "endTime": end_ts, "limit": 1000}
+    )
+    ex.shutdown(wait=False)
+
+    hist = fut_klines.result() or []
+    # One numeric conversion for the whole response: open time plus the five OHLCV columns
+    klines = np.array([e[:6] for e in hist], dtype=np.float64).reshape(-1, 6)
+    # The numeric series stay float64 arrays; orjson writes them straight from the buffer
+    # (it needs C-contiguous rows, hence the transposed copy)
+    price_history = {
+        "dates": pd.to_datetime(klines[:, 0].astype(np.int64), unit="ms", utc=True).strftime("%Y-%m-%d").tolist(),
+        **dict(zip(("open", "high", "low", "close", "volume"), np.ascontiguousarray(klines[:, 1:].T))),
+    }
+    # Whale detection only reads these columns. They come from the klines array rather
+    # than converting the JSON lists back, and stay float64 because volume and close
+    # flow straight into the payload
+    df_price = pd.DataFrame({"dates": price_history["dates"], "close": klines[:, 4], "volume": klines[:, 5]})
 
     # --- Spot ---
-    spot = make_request_with_retry(f"{BINANCE_API_URL}/api/v3/ticker/24hr", params={"symbol": "ETHUSDT"}) or {}
+    spot = fut_spot.result() or {}
     price = float(spot.get("lastPrice", 0))
     percent_change_24h = float(spot.get("priceChangePercent", 0))
     volume_24h = float(spot.get("volume", 0)) * price
 
     # --- CoinGecko ---
-    gecko = fetch_coin_gecko_data()
+    gecko = fut_gecko.result()
     if gecko:
         mkt = gecko.get("market_data", {})
         market_cap = mkt.get("market_cap", {}).get("usd", 0)
@@ -613,21 +776,20 @@ def fetch_eth_data(start_date=None, end_date=None):
         )
 
     # --- Exchange flows ---
-    trades = make_request_with_retry(
-        f"{BINANCE_API_URL}/api/v3/aggTrades",
-        params={"symbol": "ETHUSDT", "startTime": start_ts, "endTime": end_ts, "limit": 1000}
-    ) or []
+    trades = fut_trades.result() or []
 
-    df_flows = pd.DataFrame(trades)
     inflows, outflows, net_flow = 0.0, 0.0, 0.0
-    if not df_flows.empty:
-        df_flows["time"] = pd.to_datetime(df_flows["T"], unit="ms").dt.date
-        df_flows["usd_val"] = df_flows["p"].astype(float) * df_flows["q"].astype(float)
-        df_flows["side"] = df_flows["m"].map({True: "sell", False: "buy"})
-
-        flows_daily = df_flows.groupby(["time", "side"])["usd_val"].sum().unstack(fill_value=0).reset_index()
-        inflows = flows_daily.get("buy", pd.Series(0.0)).sum() / price
-        outflows = flows_daily.get("sell", pd.Series(0.0)).sum() / price
+    if trades:
+        # Buyer-is-maker trades are sells; the totals span the whole window.
+        # One pass over the response fills price, quantity and side together
+        rec = np.array(
+            [(t["p"], t["q"], t["m"]) for t in trades],
+            dtype=[("p", np.float64), ("q", np.float64), ("m", bool)],
+        )
+        usd_val = rec["p"] * rec["q"]
+        is_sell = rec["m"]
+        inflows = usd_val[~is_sell].sum() / price
+        outflows = usd_val[is_sell].sum() / price
         net_flow = inflows - outflows
 
     # --- Whale detection ---
@@ -641,17 +803,12 @@ def fetch_eth_data(start_date=None, end_date=None):
         }]
 
     # --- Fees estimate ---
-    fees = {"dates": price_history["dates"], "values": [v * 0.0001 for v in price_history["volume"]]}
+    fees = {"dates": price_history["dates"], "values": klines[:, 5] * 0.0001}
 
     # --- Performance ---
-    percent_change_7d = (
-        (df_price["close"].iloc[-1] - df_price["close"].iloc[-7]) / df_price["close"].iloc[-7] * 100
-        if len(df_price) >= 7 else 0
-    )
-    percent_change_30d = (
-        (df_price["close"].iloc[-1] - df_price["close"].iloc[-30]) / df_price["close"].iloc[-30] * 100
-        if len(df_price) >= 30 else 0
-    )
+    close = klines[:, 4]
+    percent_change_7d = (close[-1] - close[-7]) / close[-7] * 100 if len(close) >= 7 else 0
+    percent_change_30d = (close[-1] - close[-30]) / close[-30] * 100 if len(close) >= 30 else 0
 
     # --- Insights (simple, sin GPT) ---
     insights = generate_insights({
@@ -704,32 +861,8 @@ def fetch_allium_entities(start_date=None, end_date=None):
         print("[ALLIUM] Missing API key or query ID (ENTITIES)", file=sys.stderr)
         return []
 
-    base_url = "https://api.allium.so/api/v1/explorer"
-    headers = {"X-API-KEY": ALLIUM_API_KEY, "Content-Type": "application/json"}
-
     try:
-        run_url = f"{base_url}/queries/{ALLIUM_QUERY_ID_ENTITIES}/run-async"
-        payload = {"parameters": {"start_date": start_date, "end_date": end_date}, "run_config": {"limit": 10000}}
-        run_resp = requests.post(run_url, headers=headers, json=payload, timeout=60)
-        run_resp.raise_for_status()
-        run_id = run_resp.json().get("run_id")
-        if not run_id:
-            return []
-
-        # Poll status
-        status_url = f"{base_url}/query-runs/{run_id}"
-        for _ in range(30):
-            status_resp = requests.get(status_url, headers=headers, timeout=30)
-            status_resp.raise_for_status()
-            if status_resp.json().get("status") == "success":
-                break
-            time.sleep(1)
-
-        # Get results
-        results_url = f"{base_url}/query-runs/{run_id}/results"
-        results_resp = requests.get(results_url, headers=headers, timeout=60)
-        results_resp.raise_for_status()
-        data = results_resp.json().get("data", [])
+        data = run_allium_query(ALLIUM_QUERY_ID_ENTITIES, {"start_date": start_date, "end_date": end_date}) or []
 
         normalized = []
         for row in data:
@@ -761,7 +894,17 @@ if __name__ == "__main__":
 
     try:
         data = fetch_eth_data(args.start_date, args.end_date)
-        sys.stdout.write(json.dumps(data))
+        # numpy scalars (flows, % changes) serialise natively; NaN becomes null, keeping the output strict JSON.
+        # Written one top-level key at a time so the whole document is never encoded in memory at once
+        write = sys.stdout.buffer.write
+        write(b"{")
+        for i, (key, value) in enumerate(data.items()):
+            if i:
+                write(b",")
+            write(orjson.dumps(key))
+            write(b":")
+            write(orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC))
+        write(b"}")
         sys.stdout.flush()
 
         # ⚠️ Ya no hace falta porque staking_data se guarda dentro de fetch_eth_data
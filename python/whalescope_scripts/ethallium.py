@@ -18,6 +18,8 @@ import requests
 import time
 import random
 import pandas as pd
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 import argparse
 import hashlib
@@ -58,6 +60,18 @@ ALLIUM_QUERIES = {
     "chain_metrics": "6zhLhumgFL3zQlP1W6B9"
 }
 
+# One keep-alive session for the run, poll and results calls to api.allium.so
+ALLIUM_SESSION = requests.Session()
+ALLIUM_SESSION.headers.update({
+    "User-Agent": "WhaleScope/1.0",
+    "X-API-KEY": ALLIUM_API_KEY
+})
+
+# Poll backoff: short queries return within the first polls, long ones plateau
+ALLIUM_POLL_INITIAL_DELAY = 0.25
+ALLIUM_POLL_MAX_DELAY = 4.0
+ALLIUM_POLL_TIMEOUT = 30
+
 # ============================================================
 # LOGGING
 # ============================================================
@@ -151,18 +165,12 @@ def fetch_allium_staking(start_date=None, end_date=None, limit=1000):
     if not ALLIUM_API_KEY:
         return None
 
-    session = requests.Session()
-    session.headers.update({
-        "User-Agent": "WhaleScope/1.0",
-        "X-API-KEY": ALLIUM_API_KEY
-    })
-
     query_id = ALLIUM_QUERIES["chain_metrics"]
     url = f"https://api.allium.so/api/v1/explorer/queries/{query_id}/run-async"
     payload = {"parameters": {}, "run_config": {"limit": limit}}
 
     try:
-        resp = session.post(url, json=payload, timeout=30)
+        resp = ALLIUM_SESSION.post(url, json=payload, timeout=30)
         if resp.status_code != 200:
             print(f"[Allium] Error {resp.status_code}: {resp.text}", file=sys.stderr)
             return None
@@ -175,21 +183,24 @@ def fetch_allium_staking(start_date=None, end_date=None, limit=1000):
 
         # Poll until query completes
         status_url = f"https://api.allium.so/api/v1/explorer/query-runs/{run_id}"
-        for _ in range(30):
-            status = session.get(status_url).json()
+        delay = ALLIUM_POLL_INITIAL_DELAY
+        deadline = time.monotonic() + ALLIUM_POLL_TIMEOUT
+        while (remaining := deadline - time.monotonic()) > 0:
+            status = ALLIUM_SESSION.get(status_url, timeout=30).json()
             if status.get("status") == "success":
                 break
             elif status.get("status") in ("failed", "canceled"):
                 print(f"[Allium] Query failed: {status}", file=sys.stderr)
                 return None
-            time.sleep(1)
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 1.7, ALLIUM_POLL_MAX_DELAY)
         else:
             print("[Allium] Query timeout", file=sys.stderr)
             return None
 
         # Fetch results
         results_url = f"https://api.allium.so/api/v1/explorer/query-runs/{run_id}/results"
-        results = session.get(results_url).json()
+        results = ALLIUM_SESSION.get(results_url, timeout=60).json()
 
         # Parse possible formats
         if "columns" in results and "rows" in results:
@@ -232,14 +243,15 @@ def fetch_allium_staking(start_date=None, end_date=None, limit=1000):
             try:
                 sd = datetime.strptime(start_date, "%Y-%m-%d") if start_date else None
                 ed = datetime.strptime(end_date, "%Y-%m-%d") if end_date else None
-                filtered = []
-                for row in unique:
-                    if not row.get("activity_date"):
-                        continue
-                    d = datetime.strptime(row["activity_date"], "%Y-%m-%d")
-                    if (not sd or d >= sd) and (not ed or d <= ed):
-                        filtered.append(row)
-                unique = filtered
+                # Parse every row date in one pass; missing or malformed dates become NaT and drop out
+                dates = pd.to_datetime(pd.Series([row.get("activity_date") for row in unique], dtype=object),
+                                       format="%Y-%m-%d", errors="coerce")
+                keep = dates.notna()
+                if sd:
+                    keep &= dates >= sd
+                if ed:
+                    keep &= dates <= ed
+                unique = [row for row, k in zip(unique, keep.tolist()) if k]
             except Exception as e:
                 print(f"[Allium] Date filtering error: {e}", file=sys.stderr)
 
@@ -349,30 +361,37 @@ def fetch_eth_data(start_date=None, end_date=None):
 
     start_ts, end_ts = to_binance_timestamps(start_date, end_date)
 
-    # --- OHLCV ---
+    # The upstream calls (Binance, CoinGecko, Allium) don't depend on each other: start
+    # them all now and collect each result where it is used, so their latency overlaps
+    # with each other and with the pandas work below
     url_klines = f"{BINANCE_API_URL}/api/v3/klines"
     params = {"symbol": "ETHUSDT", "interval": "1d", "startTime": start_ts, "endTime": end_ts, "limit": 1000}
-    historical_data = make_request_with_retry(url_klines, params=params) or []
-    price_history = {"dates": [], "open": [], "high": [], "low": [], "close": [], "volume": []}
-    for entry in historical_data:
-        date = datetime.utcfromtimestamp(entry[0] / 1000).strftime("%Y-%m-%d")
-        price_history["dates"].append(date)
-        price_history["open"].append(float(entry[1]))
-        price_history["high"].append(float(entry[2]))
-        price_history["low"].append(float(entry[3]))
-        price_history["close"].append(float(entry[4]))
-        price_history["volume"].append(float(entry[5]))
+    pool = ThreadPoolExecutor(max_workers=5)
+    fut_klines = pool.submit(make_request_with_retry, url_klines, params=params)
+    fut_spot = pool.submit(make_request_with_retry, f"{BINANCE_API_URL}/api/v3/ticker/24hr", params={"symbol": "ETHUSDT"})
+    fut_gecko = pool.submit(fetch_coin_gecko_data)
+    fut_trades = pool.submit(make_request_with_retry, f"{BINANCE_API_URL}/api/v3/aggTrades", params={"symbol": "ETHUSDT", "limit": 1000})
+    fut_staking = pool.submit(fetch_allium_staking)
+    pool.shutdown(wait=False)
+
+    # --- OHLCV ---
+    historical_data = fut_klines.result() or []
+    # One numeric conversion for the whole response: open time plus the five OHLCV columns
+    klines = np.array([e[:6] for e in historical_data], dtype=np.float64).reshape(-1, 6)
+    price_history = {
+        "dates": pd.to_datetime(klines[:, 0].astype(np.int64), unit="ms", utc=True).strftime("%Y-%m-%d").tolist(),
+        **dict(zip(("open", "high", "low", "close", "volume"), klines[:, 1:].T.tolist())),
+    }
     df = pd.DataFrame(price_history)
 
     # --- Spot ---
-    url_ticker = f"{BINANCE_API_URL}/api/v3/ticker/24hr"
-    spot = make_request_with_retry(url_ticker, params={"symbol": "ETHUSDT"}) or {}
+    spot = fut_spot.result() or {}
     price = float(spot.get("lastPrice", 0))
     percent_change_24h = float(spot.get("priceChangePercent", 0))
     volume_24h = float(spot.get("volume", 0)) * price
 
     # --- CoinGecko ---
-    gecko = fetch_coin_gecko_data()
+    gecko = fut_gecko.result()
     if gecko:
         mkt = gecko.get("market_data", {})
         market_cap = mkt.get("market_cap", {}).get("usd", 0)
@@ -389,8 +408,7 @@ def fetch_eth_data(start_date=None, end_date=None):
         fdv = market_cap
 
     # --- Exchange Flows ---
-    url_trades = f"{BINANCE_API_URL}/api/v3/aggTrades"
-    trades = make_request_with_retry(url_trades, params={"symbol": "ETHUSDT", "limit": 1000}) or []
+    trades = fut_trades.result() or []
 
     inflows, outflows = 0.0, 0.0
     for t in trades:
@@ -409,13 +427,14 @@ def fetch_eth_data(start_date=None, end_date=None):
     top_flows = []
     if not df.empty:
         whale_signals = detector_actividad_ballenas(df)
-        for _, row in df[whale_signals].iterrows():
-            top_flows.append({
-                "timestamp": row["dates"],
-                "input_usd": row["volume"] * row["close"],
-                "output_usd": 0,
-                "status": "whale_buy"
-            })
+        # Only the flagged rows, as columns: one vectorised product, then one comprehension
+        sub = df.loc[whale_signals, ["dates", "volume", "close"]]
+        if not sub.empty:
+            inp = sub["volume"].values * sub["close"].values
+            top_flows = [
+                {"timestamp": ts, "input_usd": usd, "output_usd": 0, "status": "whale_buy"}
+                for ts, usd in zip(sub["dates"].tolist(), inp.tolist())
+            ]
     if not top_flows:
         top_flows = [{
             "timestamp": datetime.now(timezone.utc).isoformat(),
@@ -426,12 +445,13 @@ def fetch_eth_data(start_date=None, end_date=None):
     fees = {"dates": price_history["dates"], "values": [v * 0.0001 for v in price_history["volume"]]}
 
     # --- Performance ---
-    percent_change_7d = (df["close"].iloc[-1] - df["close"].iloc[-7]) / df["close"].iloc[-7] * 100 if len(df) >= 7 else 0
-    percent_change_30d = (df["close"].iloc[-1] - df["close"].iloc[-30]) / df["close"].iloc[-30] * 100 if len(df) >= 30 else 0
+    close = df["close"].to_numpy() if "close" in df else []
+    percent_change_7d = (close[-1] - close[-7]) / close[-7] * 100 if len(close) >= 7 else 0
+    percent_change_30d = (close[-1] - close[-30]) / close[-30] * 100 if len(close) >= 30 else 0
     whale_tx = top_flows[0]["input_usd"]
 
     # --- Staking (Allium) ---
-    staking_data = fetch_allium_staking()
+    staking_data = fut_staking.result()
 
     # --- Insights (Pro → fallback Basic) ---
     insights_mode = "basic"
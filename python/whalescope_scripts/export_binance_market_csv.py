@@ -19,11 +19,14 @@ import os
 import requests
 from datetime import datetime
 
+# Shared keep-alive session for the local API
+SESSION = requests.Session()
+
 
 def fetch_binance_market(symbol, start, end):
     url = "http://127.0.0.1:5001/api/binance_market"
     params = {"symbol": symbol, "startDate": start, "endDate": end}
-    r = requests.get(url, params=params, timeout=25)
+    r = SESSION.get(url, params=params, timeout=25)
 
     if r.status_code != 200:
         raise RuntimeError(f"API error: {r.status_code} {r.text}")
@@ -86,29 +89,20 @@ def export_csv(symbol, start, end):
     out_file = os.path.join(out_dir, f"WhaleScope_{sym}_{start}_{end}.csv")
 
     # === WRITE SECTIONS ===
-    with open(out_file, "w") as f:
-        f.write("=== Price Data ===\n")
-    df_price.to_csv(out_file, index=False, mode="a")
-
-    with open(out_file, "a") as f:
-        f.write("\n=== Whale Netflow (USD) ===\n")
-    df_net.to_csv(out_file, index=False, mode="a")
-
-    with open(out_file, "a") as f:
-        f.write("\n=== Market Fundamentals ===\n")
-    df_fund.to_csv(out_file, index=False, mode="a")
-
-    with open(out_file, "a") as f:
-        f.write("\n=== Performance ===\n")
-    df_perf.to_csv(out_file, index=False, mode="a")
-
-    with open(out_file, "a") as f:
-        f.write("\n=== Smart Money Indicators ===\n")
-    df_meta.to_csv(out_file, index=False, mode="a")
-
-    with open(out_file, "a") as f:
-        f.write("\n=== Whale Activity Table ===\n")
-    df_whales.to_csv(out_file, index=False, mode="a")
+    # One buffered handle for every section. newline="" leaves line endings to
+    # to_csv, so the headers use os.linesep to match its rows
+    sections = [
+        ("Price Data", df_price),
+        ("Whale Netflow (USD)", df_net),
+        ("Market Fundamentals", df_fund),
+        ("Performance", df_perf),
+        ("Smart Money Indicators", df_meta),
+        ("Whale Activity Table", df_whales),
+    ]
+    with open(out_file, "w", newline="", buffering=1 << 20) as f:
+        for i, (title, df) in enumerate(sections):
+            f.write(f"{os.linesep if i else ''}=== {title} ==={os.linesep}")
+            df.to_csv(f, index=False)
 
     print(out_file)
 
@@ -1,17 +1,15 @@
 #!/usr/bin/env python3
 # export_pdf_allium.py
 import os
+import re
 import sys
-import json
-import subprocess
 import tempfile
+from contextlib import redirect_stdout
 from datetime import datetime
 from fpdf import FPDF
-from markdown import markdown
-from bs4 import BeautifulSoup
+from staking_analysis import run as run_staking, clean_nans
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-FETCH_SCRIPT = os.path.join(BASE_DIR, "staking_analysis.py")
 
 # Detect if it is packaged in the app (DMG)
 is_frozen = getattr(sys, "frozen", False)
@@ -50,24 +48,30 @@ def clean_text(s):
     return s.replace("—", "-").replace("→", "->")
 
 
+# Markdown the insights text actually uses: links/images, rules, block prefixes
+# (headings, quotes, list bullets and numbers) and inline emphasis/code markers
+MD_LINK = re.compile(r"!?\[([^\]]*)\]\([^)]*\)")
+MD_RULE = re.compile(r"^\s*([-*_])(?:\s*\1){2,}\s*$", re.M)
+MD_PREFIX = re.compile(r"^\s*(?:#{1,6}\s+|>\s?|[-+*]\s+|\d+[.)]\s+)+", re.M)
+MD_INLINE = re.compile(r"\*\*|__|\*|`+|~~")
+
+
 def clean_markdown(md_text):
     if not md_text:
         return ["No insights available."]
-    html = markdown(md_text)
-    text = BeautifulSoup(html, "html.parser").get_text()
+    text = MD_LINK.sub(r"\1", md_text)
+    text = MD_RULE.sub("", text)
+    text = MD_PREFIX.sub("", text)
+    text = MD_INLINE.sub("", text)
     return [clean_text(line.strip()) for line in text.split("\n") if line.strip()]
 
 
 def run_fetch(symbol, start, end):
-    cmd = [
-        sys.executable, FETCH_SCRIPT,
-        "--from", start,
-        "--to", end,
-        "--chains", symbol,
-        "--format", "json"
-    ]
-    result = subprocess.check_output(cmd, text=True)
-    return json.loads(result)
+    # In-process, so no second interpreter start or pandas import; anything the
+    # analysis prints goes to stderr, keeping stdout for the PDF path
+    with redirect_stdout(sys.stderr):
+        output = run_staking([symbol], start, end)
+    return clean_nans(output)
 
 
 def generate_pdf(symbol, start, end, data, chart_path=None):
@@ -105,9 +109,8 @@ def generate_pdf(symbol, start, end, data, chart_path=None):
     pdf.cell(0, 7, "Market Insights:", ln=True)
     pdf.set_font(font, "", 11)
 
-    for line in lines:
-        pdf.multi_cell(0, 6, line)
-        pdf.ln(1)
+    # One wrap/layout pass for the whole section instead of one per line
+    pdf.multi_cell(0, 6, "\n".join(lines))
 
     # OUTPUT
     out = os.path.join(tempfile.gettempdir(), f"WhaleScope_Allium_{symbol}_{start}_{end}.pdf")
@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
 # export_pdf_binance_market.py
+import io
 import os
 import re
 import sys
 import json
+import orjson
 import tempfile
 import subprocess
 from datetime import datetime
@@ -24,32 +26,33 @@ def run_fetch(symbol, start, end):
     match = re.search(r"(\{.*\})", output, re.DOTALL)
     if not match:
         raise RuntimeError("Could not parse JSON data")
-    return json.loads(match.group(1))
+    return orjson.loads(match.group(1))
 
-def make_chart(fig, outpath):
+# Charts are rendered to PNG bytes in memory; Kaleido keeps one renderer process
+# alive for the whole run, so only the first chart pays its startup
+def make_chart(fig):
     fig.update_layout(template="simple_white")
-    fig.write_image(outpath)
+    return fig.to_image(format="png")
 
-def make_chart_price(data, outpath):
+def make_chart_price(data):
     candles = data.get("candles", {})
     if candles.get("dates"):
-        make_chart(
+        return make_chart(
             go.Figure(data=[go.Candlestick(
                 x=candles["dates"], open=candles["open"], high=candles["high"],
                 low=candles["low"], close=candles["close"]
-            )]),
-            outpath
+            )])
         )
 
-def make_chart_netflow(data, outpath):
+def make_chart_netflow(data):
     net = data.get("netflow", {})
     if net.get("dates"):
-        make_chart(go.Figure(data=[go.Bar(x=net["dates"], y=net["values"])]), outpath)
+        return make_chart(go.Figure(data=[go.Bar(x=net["dates"], y=net["values"])]))
 
-def make_chart_fees(data, outpath):
+def make_chart_fees(data):
     fees = data.get("fees", {})
     if fees.get("dates"):
-        make_chart(go.Figure(data=[go.Scatter(x=fees["dates"], y=fees["values"], mode="lines")]), outpath)
+        return make_chart(go.Figure(data=[go.Scatter(x=fees["dates"], y=fees["values"], mode="lines")]))
 
 def generate_pdf(symbol, start, end, market):
     pdf = FPDF()
@@ -89,16 +92,10 @@ def generate_pdf(symbol, start, end, market):
 
     # CHARTS
     tmp = tempfile.gettempdir()
-    charts = [
-        (make_chart_price, os.path.join(tmp, f"{symbol}_price.png")),
-        (make_chart_netflow, os.path.join(tmp, f"{symbol}_netflow.png")),
-        (make_chart_fees, os.path.join(tmp, f"{symbol}_fees.png")),
-    ]
-
-    for func, img_path in charts:
-        func(market, img_path)
-        if os.path.exists(img_path):
-            pdf.image(img_path, w=165)
+    for func in (make_chart_price, make_chart_netflow, make_chart_fees):
+        png = func(market)
+        if png:
+            pdf.image(io.BytesIO(png), w=165)
             pdf.ln(4)
 
     # AI INSIGHTS
@@ -8,10 +8,14 @@ and leaves an execution log in fetch_allium.log
 
 import subprocess
 import datetime
-import sqlite3
+import logging
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+from db_utils import open_db
+from staking_analysis import run as run_staking
+
 # ===============================================
 # 🧩 CONFIGURACIÓN
 # ===============================================
@@ -24,13 +28,19 @@ LOG_PATH = BASE_PATH / "fetch_allium.log"
 # ===============================================
 # 🪵 UTILIDAD DE LOGGING
 # ===============================================
+# Console and log file share one formatter; the file stays open for the whole run
+logger = logging.getLogger("fetch_allium")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_formatter = logging.Formatter("[%(asctime)s] %(message)s", "%Y-%m-%d %H:%M:%S")
+for _handler in (logging.StreamHandler(sys.stdout), logging.FileHandler(LOG_PATH, delay=True)):
+    _handler.setFormatter(_formatter)
+    logger.addHandler(_handler)
+
+
 def log(msg: str):
     """Writes message to console and log file"""
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    line = f"[{timestamp}] {msg}"
-    print(line)
-    with open(LOG_PATH, "a") as f:
-        f.write(line + "\n")
+    logger.info(msg)
 
 
 # ===============================================
@@ -53,29 +63,32 @@ def get_db_status():
         log("⚠️ Database not found, everything will be downloaded from scratch.")
         return [{"chain": c, "end_date": "2023-01-01"} for c in CHAINS]
 
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+    # One pass over staking_data: per-symbol bounds, counts and the day after the
+    # last one (index-only with idx_staking_symbol), then each chain folds in
+    # every symbol containing its prefix
+    conn = open_db(DB_PATH)
     rows = []
-    for chain in CHAINS:
-        try:
-            q = f"""
-            SELECT '{chain}' AS chain,
-                   MIN(activity_date) AS start_date,
-                   MAX(activity_date) AS end_date,
-                   COUNT(*) AS records
+    try:
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_staking_symbol ON staking_data(symbol, activity_date)")
+        per_symbol = conn.execute("""
+            SELECT LOWER(symbol), MIN(activity_date), MAX(activity_date), COUNT(*),
+                   date(MAX(activity_date), '+1 day')
             FROM staking_data
-            WHERE LOWER(symbol) LIKE '%{chain[:3]}%';
-            """
-            cur.execute(q)
-            data = cur.fetchone()
+            GROUP BY symbol
+        """).fetchall()
+        for chain in CHAINS:
+            matches = [r for r in per_symbol if r[0] and chain[:3] in r[0]]
+            starts = [r[1] for r in matches if r[1]]
+            latest = max((r for r in matches if r[2]), key=lambda r: r[2], default=None)
             rows.append({
                 "chain": chain,
-                "start_date": data[1] if data and data[1] else None,
-                "end_date": data[2] if data and data[2] else None,
-                "records": data[3] if data else 0
+                "start_date": min(starts) if starts else None,
+                "end_date": latest[2] if latest else None,
+                "next_day": latest[4] if latest else None,
+                "records": sum(r[3] for r in matches)
             })
-        except Exception as e:
-            log(f"⚠️ Error leyendo {chain}: {e}")
+    except Exception as e:
+        log(f"⚠️ Error leyendo staking_data: {e}")
     conn.close()
     return rows
 
@@ -83,14 +96,16 @@ def get_db_status():
 def fetch_chain(chain, start_date, end_date):
     """Download and update staking_data"""
     log(f"🔎 Fetching {chain} desde {start_date} hasta {end_date}...")
-    args = [
-        "python", "staking_analysis.py",
-        "--chains", chain,
-        "--from", start_date,
-        "--to", end_date,
-        "--format", "json"
-    ]
-    run_cmd(args)
+    # In-process: no interpreter start or pandas import per chain, and no JSON round trip
+    try:
+        result = run_staking([chain], start_date, end_date)["results"].get(chain, {})
+    except Exception as e:
+        result = {"status": "error", "error": str(e)}
+    if result.get("status") == "error":
+        log(f"⚠️ Error fetching {chain}: {result.get('error')}")
+        return False
+    log(f"✅ {chain} updated.")
+    return True
 
 
 def update_whales():
@@ -110,14 +125,20 @@ def main():
     db_status = get_db_status()
     today = datetime.date.today().isoformat()
 
-    for entry in db_status:
+    def update_chain(entry):
         chain = entry["chain"]
         end_date = entry["end_date"][:10] if entry.get("end_date") else "2023-01-01"
-        next_day = (datetime.date.fromisoformat(end_date) + datetime.timedelta(days=1)).isoformat()
+        next_day = entry.get("next_day") or (
+            datetime.date.fromisoformat(end_date) + datetime.timedelta(days=1)
+        ).isoformat()
 
         log(f"📊 {chain}: last date {end_date}, bringing from {next_day} until {today}")
         fetch_chain(chain, next_day, today)
 
+    # Chains are independent and each fetch is I/O-bound, so they run side by side
+    with ThreadPoolExecutor(max_workers=max(len(db_status), 1)) as ex:
+        list(ex.map(update_chain, db_status))
+
     if update_whales_flag:
         update_whales()
 
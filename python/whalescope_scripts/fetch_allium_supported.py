@@ -10,6 +10,9 @@ import json
 import time
 import requests
 import pandas as pd
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -19,6 +22,23 @@ QUERY_ID = os.getenv("ALLIUM_QUERY_ID", "AcUpz2e1YbQtkOkM1BHG")  # ETH base quer
 BASE_URL = "https://api.allium.so/api/v1/explorer"
 HEADERS = {"X-API-KEY": API_KEY, "Content-Type": "application/json"}
 
+MAX_WORKERS = 8
+
+# One keep-alive session shared by every symbol's run/poll/results calls. The pool
+# covers every worker; transient errors on the GETs are retried with backoff
+# (urllib3 never retries the run-creating POST)
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16, pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 502, 503, 504], raise_on_status=False),
+))
+
+# Poll backoff: start fast, grow to a plateau, give up at the budget
+POLL_INITIAL_DELAY = 0.5
+POLL_MAX_DELAY = 8.0
+POLL_TIMEOUT = 30
+
 # Lista inicial (puedes ampliarla)
 SYMBOLS = [
     "ETH", "SOL", "MATIC", "BNB", "NEAR", "SUI", "TON", "APTOS",
@@ -43,7 +63,7 @@ def test_symbol(symbol):
     try:
         # 1️⃣ Crear run
         run_url = f"{BASE_URL}/queries/{QUERY_ID}/run-async"
-        run_resp = requests.post(run_url, headers=HEADERS, json=payload, timeout=60)
+        run_resp = SESSION.post(run_url, json=payload, timeout=60)
         if run_resp.status_code not in (200, 202):
             print(f"❌ {symbol} → {run_resp.status_code}")
             return {"symbol": symbol, "status": "error", "rows": 0}
@@ -56,8 +76,10 @@ def test_symbol(symbol):
 
         # 2️⃣ Polling
         poll_url = f"{BASE_URL}/query-runs/{run_id}"
-        for i in range(15):
-            poll_resp = requests.get(poll_url, headers=HEADERS, timeout=30)
+        delay = POLL_INITIAL_DELAY
+        deadline = time.monotonic() + POLL_TIMEOUT
+        while (remaining := deadline - time.monotonic()) > 0:
+            poll_resp = SESSION.get(poll_url, timeout=30)
             poll_data = poll_resp.json()
             status = poll_data.get("status", "").lower()
             if status in ("completed", "success", "done", "finished"):
@@ -65,11 +87,12 @@ def test_symbol(symbol):
             elif status in ("failed", "error"):
                 print(f"❌ {symbol} → Query failed")
                 return {"symbol": symbol, "status": "failed", "rows": 0}
-            time.sleep(2)
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 1.7, POLL_MAX_DELAY)
 
         # 3️⃣ Obtener resultados
         results_url = f"{poll_url}/results"
-        results_resp = requests.get(results_url, headers=HEADERS, timeout=60)
+        results_resp = SESSION.get(results_url, timeout=60)
         data = results_resp.json().get("data", [])
         count = len(data)
         status = "✅ OK" if count > 0 else "⚠️ Empty"
@@ -88,9 +111,9 @@ def main():
         return
 
     print(f"🚀 Probando {len(SYMBOLS)} symbols with query_id {QUERY_ID}\n")
-    for sym in SYMBOLS:
-        res = test_symbol(sym)
-        results.append(res)
+    # Each symbol spends most of its time waiting on Allium, so test them side by side
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        results.extend(ex.map(test_symbol, SYMBOLS))
 
     df = pd.DataFrame(results)
     df.to_csv("allium_supported.csv", index=False)
@@ -6,13 +6,14 @@
 # Query historical balances from whalescope.db for BlackRock entity
 
 import sys
+import orjson
 import sqlite3
-import json
 import logging
+import numpy as np
 import pandas as pd
 import argparse
 import os
-from datetime import datetime
+from db_utils import open_db
 
 # Logging
 logging.basicConfig(
@@ -28,7 +29,15 @@ DB_PATH = os.path.join(HERE, "..", "..", "whalescope.db")
 def query_balances(start_date, end_date):
     """Query historical BTC/ETH balances from whalescope.db for BlackRock."""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = open_db(DB_PATH)
+        # Entity + token equality and the timestamp range become an index seek
+        try:
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_arkham_entity_token_ts "
+                "ON arkham_wallets(entity_id, token, timestamp)"
+            )
+        except sqlite3.Error as e:
+            logging.warning(f"Could not create arkham_wallets index: {e}")
         query = """
         SELECT token, balance, balance_usd, timestamp
         FROM arkham_wallets
@@ -48,16 +57,20 @@ def format_data(df):
     """Format balance data as JSON (per token)."""
     if df.empty:
         return {'BTC': [], 'ETH': []}
+    # Work on plain column arrays: timestamps are parsed and ISO-formatted in C
+    # (datetime64 -> str), each token is a boolean mask over the same arrays and
+    # the records are zipped from native lists instead of going through to_dict
+    parsed = pd.to_datetime(df['timestamp'], format="%Y-%m-%d %H:%M:%S").to_numpy(dtype='datetime64[s]')
+    timestamps = np.char.add(np.datetime_as_string(parsed, unit='s'), 'Z')
+    tokens = df['token'].to_numpy()
+    balance = df['balance'].to_numpy()
+    balance_usd = df['balance_usd'].to_numpy()
     data = {}
-    for token in df['token'].unique():
-        token_df = df[df['token'] == token]
+    for token in pd.unique(tokens):
+        mask = tokens == token
         data[token] = [
-            {
-                'timestamp': datetime.strptime(row['timestamp'], "%Y-%m-%d %H:%M:%S").isoformat() + "Z",
-                'balance': row['balance'],
-                'balance_usd': row['balance_usd']
-            }
-            for _, row in token_df.iterrows()
+            {'timestamp': ts, 'balance': bal, 'balance_usd': usd}
+            for ts, bal, usd in zip(timestamps[mask].tolist(), balance[mask].tolist(), balance_usd[mask].tolist())
         ]
     logging.info(f"Formatted data: { {k: len(v) for k,v in data.items()} }")
     return data
@@ -78,15 +91,17 @@ def main():
 
         if not args.api:
             out_file = 'blackrock_balances.json'
-            with open(out_file, 'w') as f:
-                json.dump(data, f, indent=4)
+            with open(out_file, 'wb') as f:
+                f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
             logging.info(f"Saved balance data to {out_file}")
 
-        print(json.dumps(data))  # Always print for IPC
+        # Always print for IPC; orjson writes NaN as null, so the payload stays strict JSON
+        sys.stdout.buffer.write(orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY) + b'\n')
         sys.stdout.flush()
     except Exception as e:
         logging.error(f"Error in main: {e}")
-        print(json.dumps({'error': str(e)}))
+        sys.stdout.buffer.write(orjson.dumps({'error': str(e)}) + b'\n')
+        sys.stdout.flush()
 
 if __name__ == "__main__":
     main()
@@ -5,10 +5,12 @@ Force insert Allium data into SQLite for MarketBrain.
 
 import os
 import sqlite3
-import json
+import orjson
 import subprocess
 from datetime import datetime
 
+from db_utils import open_db
+
 # Path to the database
 DB_PATH = os.path.expanduser(
     "~/Desktop/whalescope-desktop/whalescope/python/whalescope_scripts/whalescope.db"
@@ -42,7 +44,7 @@ def fetch_allium():
         print(result.stderr)
         return []
     try:
-        data = json.loads(result.stdout)
+        data = orjson.loads(result.stdout)
         return data.get("results", [])
     except Exception as e:
         print("❌ Error parsing JSON:", e)
@@ -50,35 +52,57 @@ def fetch_allium():
         return []
 
 
+SQL_INSERT_METRIC = """
+    INSERT OR IGNORE INTO metrics
+    (activity_date, chain, active_addresses, total_transactions, transaction_fees_usd)
+    VALUES (?, ?, ?, ?, ?)
+"""
+METRIC_FIELDS = ("activity_date", "chain", "active_addresses", "total_transactions", "transaction_fees_usd")
+SQL_EXISTING_KEYS = "SELECT activity_date, chain FROM metrics WHERE activity_date >= ?"
+
+
+def metric_values(rows, existing=None):
+    """Yield one parameter tuple per new row, reporting rows with missing fields.
+
+    Rows whose (activity_date, chain) key is in `existing` are skipped, and each
+    yielded key is added to it, so repeated rows never reach SQLite.
+    """
+    existing = set() if existing is None else existing
+    for row in rows:
+        try:
+            values = tuple(row[field] for field in METRIC_FIELDS)
+        except KeyError as e:
+            print("⚠️ Error inserting row: missing", e, row)
+            continue
+        if values[:2] in existing:
+            continue
+        existing.add(values[:2])
+        yield values
+
+
 def insert_into_sqlite(rows):
     """Insert Allium query results into whalescope.db."""
     if not os.path.exists(DB_PATH):
         print(f"❌ Database not found at {DB_PATH}")
         return
 
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
+    # One transaction and one prepared statement for the whole load; executemany
+    # pulls the tuples from the generator, so no parameter list is built. Keys
+    # already stored from the batch's first date on are read once up front, so
+    # re-runs skip known rows in Python instead of probing the index per row
+    dates = [row["activity_date"] for row in rows if row.get("activity_date") is not None]
+    conn = open_db(DB_PATH)
     inserted = 0
-    for row in rows:
-        try:
-            cur.execute("""
-                INSERT OR IGNORE INTO metrics
-                (activity_date, chain, active_addresses, total_transactions, transaction_fees_usd)
-                VALUES (?, ?, ?, ?, ?)
-            """, (
-                row["activity_date"],
-                row["chain"],
-                row["active_addresses"],
-                row["total_transactions"],
-                row["transaction_fees_usd"]
-            ))
-            inserted += 1
-        except Exception as e:
-            print("⚠️ Error inserting row:", e, row)
-
-    conn.commit()
-    conn.close()
+    try:
+        with conn:
+            existing = set(conn.execute(SQL_EXISTING_KEYS, (min(dates),))) if dates else set()
+            before = conn.total_changes
+            conn.executemany(SQL_INSERT_METRIC, metric_values(rows, existing))
+            inserted = conn.total_changes - before
+    except sqlite3.Error as e:
+        print("⚠️ Error inserting rows, batch rolled back:", e)
+    finally:
+        conn.close()
     print(f"✅ Inserted {inserted} new records into {DB_PATH}")
 
 
@@ -1,11 +1,13 @@
 # fundamental.py
 
 import requests
-import sqlite3
+import numpy as np
 from datetime import datetime
 import urllib3
 import os
 
+from db_utils import open_db
+
 # Desactivar advertencias de SSL (no recomendado, solo para fines académicos)
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -19,7 +21,7 @@ current_date_str = current_date.strftime('%Y-%m-%d')
 # Base de datos SQLite (ruta dinámica)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, "whalescope.db")
-conn = sqlite3.connect(DB_PATH)
+conn = open_db(DB_PATH)
 cursor = conn.cursor()
 cursor.execute('''CREATE TABLE IF NOT EXISTS macro_events
                   (date TEXT, title TEXT, description TEXT, source TEXT, timestamp TEXT)''')
@@ -45,24 +47,20 @@ def fetch_fed_data():
         data = response.json()
         observations = data.get("observations", [])
         
-        # Procesar datos para detectar cambios en la tasa
-        fed_events = []
-        previous_value = None
-        for obs in observations:
-            date = obs["date"]
-            if date > current_date_str:
-                continue
-            value = float(obs["value"])
-            
-            # Detectar cambios en la tasa
-            if previous_value is not None and value != previous_value:
-                fed_events.append({
-                    "date": date,
-                    "title": "FED Funds Rate Update",
-                    "description": f"FED Funds Rate changed to {value}% (previous: {previous_value}%)",
-                    "source": "FRED API"
-                })
-            previous_value = value
+        # Procesar datos para detectar cambios en la tasa; FRED marca los huecos con "."
+        observations = [o for o in observations
+                        if o["date"] <= current_date_str and o["value"] not in (".", "")]
+        values = np.array([float(o["value"]) for o in observations])
+        dates = [o["date"] for o in observations]
+
+        # Detectar cambios en la tasa: un solo diff sobre toda la serie
+        changed = np.flatnonzero(np.diff(values) != 0) + 1
+        fed_events = [{
+            "date": dates[i],
+            "title": "FED Funds Rate Update",
+            "description": f"FED Funds Rate changed to {value}% (previous: {previous_value}%)",
+            "source": "FRED API"
+        } for i, value, previous_value in zip(changed, values[changed].tolist(), values[changed - 1].tolist())]
         
         print(f"Fetched {len(fed_events)} FED events")
         return fed_events
@@ -1,6 +1,7 @@
 # market_analysis.py
 # Funciones comunes para generar análisis de mercado (BTC, ETH, etc.)
 
+import numpy as np
 import pandas as pd
 
 def generate_trading_advice(price, change_24h, net_flow, whale_tx, support_level, df: pd.DataFrame, asset="BTC"):
@@ -55,13 +56,19 @@ def generate_trading_advice(price, change_24h, net_flow, whale_tx, support_level
 
     # --- Tendencias de 7d y 30d + Volatilidad ---
     if not df.empty:
-        last30 = df["close"].tail(30)
+        # Plain array slices of the closes; no intermediate Series
+        closes = df["close"].to_numpy(dtype=np.float64)
+        last30 = closes[-30:]
         if len(last30) >= 7:
-            weekly_change = (last30.iloc[-1] - last30.iloc[-7]) / last30.iloc[-7] * 100
-            monthly_change = (last30.iloc[-1] - last30.iloc[0]) / last30.iloc[0] * 100
+            weekly_change = (last30[-1] - last30[-7]) / last30[-7] * 100
+            monthly_change = (last30[-1] - last30[0]) / last30[0] * 100
             analysis.append(f"7d trend: {weekly_change:.2f}% | 30d trend: {monthly_change:.2f}%")
 
-        vol = df["close"].tail(7).pct_change().std() * 100
+        # Sample std (ddof=1) of the daily returns over the last 7 closes, as pct_change().std()
+        last7 = closes[-7:]
+        returns = np.diff(last7) / last7[:-1]
+        returns = returns[~np.isnan(returns)]
+        vol = returns.std(ddof=1) * 100 if returns.size >= 2 else np.nan
         analysis.append(f"7d volatility: {vol:.2f}%")
 
     return " — ".join(analysis)
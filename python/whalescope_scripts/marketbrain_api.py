@@ -5,11 +5,14 @@ API Flask para servir datos de marketbrain.db a la UI + exportación CSV/PDF
 (Versión final: tablas ajustadas, formato numérico, limpieza de nulos, layout en landscape, e inclusión automática de todos los símbolos)
 """
 
-from flask import Flask, jsonify, request, send_file
+from flask import Flask, Response, jsonify, request
+import atexit
+import csv
+import json
 import sqlite3
-import pandas as pd
+import threading
 from datetime import datetime
-from io import BytesIO
+from io import StringIO
 from reportlab.platypus import (
     SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
 )
@@ -19,6 +22,8 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib.enums import TA_CENTER
 
+from db_utils import open_db
+
 app = Flask(__name__)
 
 DB_PATH = "/Users/cauco/Desktop/whalescope-desktop/whalescope/python/whalescope_scripts/marketbrain.db"
@@ -27,13 +32,56 @@ DB_PATH = "/Users/cauco/Desktop/whalescope-desktop/whalescope/python/whalescope_
 # 🔹 Utilidades
 # ============================================================
 
+# One read-only connection per request thread, so a long export never blocks the
+# other endpoints. Connections are tracked with their thread: those of finished
+# threads are closed when the next one opens, the rest at exit
+_local = threading.local()
+_open_conns = []
+_open_conns_lock = threading.Lock()
+EXPORT_CHUNK_ROWS = 10_000
+
+EXPORT_COLUMNS = [
+    "symbol", "activity_date",
+    "total_stake", "active_stake", "active_stake_usd_current",
+    "pct_total_stake_active", "pct_circulating_staked_est",
+    "token_price", "net_flow", "deposits_est", "withdrawals_est"
+]
+# Fixed SQL text per branch so sqlite3's statement cache reuses the plan: the
+# symbol filter binds one JSON array instead of a variable number of "?"
+SQL_EXPORT_ALL = f"SELECT {', '.join(EXPORT_COLUMNS)} FROM staking_data WHERE symbol IS NOT NULL"
+SQL_EXPORT_SYMBOLS = (
+    f"SELECT {', '.join(EXPORT_COLUMNS)} FROM staking_data "
+    "WHERE symbol IN (SELECT value FROM json_each(?))"
+)
+
+def _get_conn():
+    """Return this thread's read-only marketbrain.db connection, opening it on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        # check_same_thread=False only so the pruning below and atexit may close it
+        conn = open_db(DB_PATH, check_same_thread=False)
+        conn.execute("PRAGMA query_only=1")
+        _local.conn = conn
+        with _open_conns_lock:
+            for thread, stale in _open_conns:
+                if not thread.is_alive():
+                    stale.close()
+            _open_conns[:] = [(t, c) for t, c in _open_conns if t.is_alive()]
+            _open_conns.append((threading.current_thread(), conn))
+    return conn
+
+@atexit.register
+def _close_conns():
+    with _open_conns_lock:
+        for _, conn in _open_conns:
+            conn.close()
+        _open_conns.clear()
+
 def query_db(query, args=(), one=False):
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
+    cur = _get_conn().cursor()
+    cur.row_factory = sqlite3.Row
     cur.execute(query, args)
     rows = cur.fetchall()
-    conn.close()
     data = [dict(row) for row in rows]
     return (data[0] if data else None) if one else data
 
@@ -78,27 +126,15 @@ def root():
 def export_csv():
     symbols_param = request.args.get("symbols")
     if symbols_param:
-        symbols = symbols_param.split(",")
+        query = SQL_EXPORT_SYMBOLS
+        params = [json.dumps(symbols_param.split(","))]
     else:
-        all_symbols = query_db("SELECT DISTINCT symbol FROM staking_data")
-        symbols = [s["symbol"] for s in all_symbols]
+        query = SQL_EXPORT_ALL
+        params = []
 
     start_date = request.args.get("startDate")
     end_date = request.args.get("endDate")
 
-    columns = [
-        "symbol", "activity_date",
-        "total_stake", "active_stake", "active_stake_usd_current",
-        "pct_total_stake_active", "pct_circulating_staked_est",
-        "token_price", "net_flow", "deposits_est", "withdrawals_est"
-    ]
-
-    query = f"""
-        SELECT {', '.join(columns)}
-        FROM staking_data
-        WHERE symbol IN ({','.join(['?'] * len(symbols))})
-    """
-    params = symbols
     if start_date:
         query += " AND activity_date >= ?"
         params.append(start_date)
@@ -107,23 +143,34 @@ def export_csv():
         params.append(end_date)
     query += " ORDER BY symbol, activity_date ASC"
 
-    with sqlite3.connect(DB_PATH) as conn:
-        df = pd.read_sql(query, conn, params=params)
-
-    if df.empty:
+    # The first batch decides the 404; the rest is streamed as it is fetched
+    cur = _get_conn().execute(query, params)
+    rows = cur.fetchmany(EXPORT_CHUNK_ROWS)
+    if not rows:
         return jsonify({"error": "No data found for selection"}), 404
 
-    output = BytesIO()
-    df.to_csv(output, index=False)
-    output.seek(0)
-
-    return send_file(
-        output,
+    return Response(
+        csv_batches(cur, rows),
         mimetype="text/csv",
-        as_attachment=True,
-        download_name="marketbrain_export_full.csv"
+        headers={"Content-Disposition": "attachment; filename=marketbrain_export_full.csv"}
     )
 
+def csv_batches(cur, rows):
+    """Yield the CSV header and rows as encoded chunks, one fetchmany batch at a time.
+
+    Only the current batch and its CSV text are in memory; the response is sent
+    while the cursor is still being read.
+    """
+    buf = StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(EXPORT_COLUMNS)
+    while rows:
+        writer.writerows(rows)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+        rows = cur.fetchmany(EXPORT_CHUNK_ROWS)
+
 # ============================================================
 # 🧠 EXPORT PDF (todos los símbolos automáticamente)
 # ============================================================
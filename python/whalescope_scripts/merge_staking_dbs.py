@@ -9,16 +9,38 @@ import pandas as pd
 from pathlib import Path
 import time
 import sys
-from datetime import datetime
+
+from db_utils import open_db
 
 
 def log(msg):
     """Log messages safely to stderr (won’t break JSON output)."""
-    ts = datetime.utcnow().strftime("[%H:%M:%S]")
+    ts = time.strftime("[%H:%M:%S]", time.gmtime())
     sys.stderr.write(f"{ts} {msg}\n")
     sys.stderr.flush()
 
 
+# SQLite column types for the inferred pandas kinds, as DataFrame.to_sql assigns them
+SQL_TYPES = {"integer": "INTEGER", "boolean": "INTEGER", "floating": "REAL",
+             "mixed-integer-float": "REAL", "datetime64": "TIMESTAMP", "datetime": "TIMESTAMP"}
+
+
+def replace_table(conn, table, df):
+    """Recreate `table` from the frame's columns and bulk-load its rows with one executemany.
+
+    to_sql issues one INSERT per row; here the rows stream from itertuples into
+    a single prepared statement inside the caller's transaction.
+    """
+    columns = ", ".join(
+        f'"{col}" {SQL_TYPES.get(pd.api.types.infer_dtype(df[col], skipna=True), "TEXT")}'
+        for col in df.columns
+    )
+    conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+    conn.execute(f'CREATE TABLE "{table}" ({columns})')
+    placeholders = ", ".join("?" * len(df.columns))
+    conn.executemany(f'INSERT INTO "{table}" VALUES ({placeholders})', df.itertuples(index=False, name=None))
+
+
 def merge_eth_staking(retries=3, delay=1.5):
     """Merge ETH data from whalescope.db and electron/whalescope.db into marketbrain.db safely."""
     log("🔗 Connecting to databases...")
@@ -29,9 +51,10 @@ def merge_eth_staking(retries=3, delay=1.5):
     db_electron = base / "electron/whalescope.db"
 
     # --- Conexiones de lectura ---
+    # Read-only: the sources (one is the Electron app's own DB) keep their journal mode
     try:
-        conn_wscope = sqlite3.connect(db_whalescope)
-        conn_elec = sqlite3.connect(db_electron)
+        conn_wscope = sqlite3.connect(f"{db_whalescope.as_uri()}?mode=ro", uri=True)
+        conn_elec = sqlite3.connect(f"{db_electron.as_uri()}?mode=ro", uri=True)
     except Exception as e:
         log(f"❌ Database connection error: {e}")
         return
@@ -56,15 +79,12 @@ def merge_eth_staking(retries=3, delay=1.5):
     # --- Intentar grabar con reintentos ---
     for attempt in range(1, retries + 1):
         try:
-            conn_main = sqlite3.connect(db_main, timeout=10)
+            conn_main = open_db(db_main, timeout=10)
             conn_main.execute("BEGIN IMMEDIATE;")  # Bloqueo de escritura
             log(f"💾 Writing ETH data (attempt {attempt}/{retries})...")
 
-            conn_main.execute("DROP TABLE IF EXISTS staking_activity;")
-            df_eth_activity.to_sql("staking_activity", conn_main, if_exists="replace", index=False)
-
-            conn_main.execute("DROP TABLE IF EXISTS staking_eth_ratio;")
-            df_eth_ratio.to_sql("staking_eth_ratio", conn_main, if_exists="replace", index=False)
+            replace_table(conn_main, "staking_activity", df_eth_activity)
+            replace_table(conn_main, "staking_eth_ratio", df_eth_ratio)
 
             conn_main.commit()
             conn_main.close()
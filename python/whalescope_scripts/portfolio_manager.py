@@ -1,18 +1,19 @@
 # portfolio_manager.py
 
 import pandas as pd
-import sqlite3
 import numpy as np
 from datetime import datetime, timedelta
 import os
 
+from db_utils import open_db
+
 # ====== CONFIG ======
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, "crypto_data.db")
 
 def sort_portfolio(criteria="momentum", start_date=None, end_date=None, top_n=5):
     """Sort portfolio based on criteria (SMB, HML, momentum)."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = open_db(DB_PATH)
     end_date = end_date or datetime.utcnow().date()
     start_date = start_date or (end_date - timedelta(days=30))
     
@@ -46,7 +47,7 @@ def rebalance_portfolio(portfolio, weights=None, rebalance_date=None):
     weights = weights or {symbol: 1/len(portfolio) for symbol in portfolio}
     rebalance_date = rebalance_date or datetime.utcnow().date()
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = open_db(DB_PATH)
     query = "SELECT symbol, price FROM staking WHERE date = ? AND symbol IN ({})".format(
         ",".join(["?"] * len(portfolio))
     )
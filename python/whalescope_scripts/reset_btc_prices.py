@@ -1,9 +1,9 @@
 
 # reset_btc_prices.py
 
-import sqlite3
+from db_utils import open_db
 
-conn = sqlite3.connect("whalescope.db")
+conn = open_db("whalescope.db")
 cursor = conn.cursor()
 cursor.execute("DROP TABLE IF EXISTS btc_prices")
 cursor.execute('''CREATE TABLE btc_prices
@@ -1,11 +1,15 @@
 # sentiment_analysis.py
 
 import requests
-import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import os
 import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from db_utils import open_db
 
 load_dotenv()
 
@@ -17,10 +21,24 @@ SYMBOLS = [
     "BTC", "ETH", "SOL", "ADA", "BNB", "AVAX", "TRX", "DOT", "MATIC", "NEAR",
     "ATOM", "XRP", "LINK", "LTC", "DOGE"
 ]
+MAX_WORKERS = 8
+
+# One pooled keep-alive session shared by the symbol fetches
+SESSION = requests.Session()
+SESSION.headers.update({"Authorization": f"Bearer {LUNARCRUSH_API_KEY}"})
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16, pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.3),
+))
+
+SQL_INSERT_SENTIMENT = """
+    INSERT OR REPLACE INTO sentiment (date, symbol, sentiment_score, social_volume)
+    VALUES (?, ?, ?, ?)
+"""
 
 def init_sentiment_db():
     """Initialize sentiment table."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = open_db(DB_PATH)
     conn.execute("""
         CREATE TABLE IF NOT EXISTS sentiment (
             date TEXT,
@@ -36,14 +54,13 @@ def init_sentiment_db():
 def fetch_sentiment(symbol, start_date, end_date):
     """Fetch sentiment data from LunarCrush."""
     url = f"https://api.lunarcrush.com/v2/coin/{symbol.lower()}"
-    headers = {"Authorization": f"Bearer {LUNARCRUSH_API_KEY}"}
     params = {
         "start": int(start_date.timestamp()),
         "end": int(end_date.timestamp()),
         "timeframe": "1w"  # Weekly data
     }
     try:
-        r = requests.get(url, headers=headers, params=params)
+        r = SESSION.get(url, params=params, timeout=30)
         r.raise_for_status()
         data = r.json()
         return [
@@ -64,25 +81,27 @@ def main(start_date=None, end_date=None):
     start_date = start_date or (end_date - timedelta(days=30))
     results = []
 
-    for symbol in SYMBOLS:
-        sentiment_data = fetch_sentiment(symbol, start_date, end_date)
-        for record in sentiment_data:
-            results.append({
-                "date": record["date"],
-                "symbol": symbol,
-                "sentiment_score": record["sentiment_score"],
-                "social_volume": record["social_volume"]
-            })
-            conn = sqlite3.connect(DB_PATH)
-            conn.execute("""
-                INSERT OR REPLACE INTO sentiment (date, symbol, sentiment_score, social_volume)
-                VALUES (?, ?, ?, ?)
-            """, (
-                record["date"], symbol, record["sentiment_score"], record["social_volume"]
-            ))
-            conn.commit()
-            conn.close()
-    
+    # The fetches are network-bound, so run them side by side before touching the DB
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        fetched = list(ex.map(lambda symbol: fetch_sentiment(symbol, start_date, end_date), SYMBOLS))
+
+    # One connection and one transaction for every symbol, one executemany per symbol
+    conn = open_db(DB_PATH)
+    try:
+        with conn:
+            for symbol, sentiment_data in zip(SYMBOLS, fetched):
+                rows = [
+                    (record["date"], symbol, record["sentiment_score"], record["social_volume"])
+                    for record in sentiment_data
+                ]
+                conn.executemany(SQL_INSERT_SENTIMENT, rows)
+                results.extend(
+                    {"date": d, "symbol": sym, "sentiment_score": score, "social_volume": volume}
+                    for d, sym, score, volume in rows
+                )
+    finally:
+        conn.close()
+
     return results
 
 if __name__ == "__main__":
@@ -15,6 +15,7 @@ MarketBrain Ultimate — Allium + CoinGecko + Arkham + Whale Detector + DB
 import os
 import sys
 import json
+import orjson
 import argparse
 import statistics
 import hashlib
@@ -26,6 +27,8 @@ import pandas as pd
 import sqlite3
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # 🔹 Importar módulos locales
 from whale_detector import fetch_binance_klines, detect_whale_flows
@@ -53,9 +56,9 @@ if os.path.exists(CONFIG_PATH):
 # Logging
 # ============================================================
 
-def log(*args, **kwargs):
-    prefix = f"[{datetime.now().strftime('%H:%M:%S')}]"
-    print(prefix, *args, file=sys.stderr, **kwargs)
+def log(*args, sep=" "):
+    # time.strftime skips building a datetime on every (frequent) log call
+    sys.stderr.write(f"[{time.strftime('%H:%M:%S')}] {sep.join(map(str, args))}\n")
 
 
 # ============================================================
@@ -76,9 +79,21 @@ ALLIUM_QUERIES = {
     "MULTI": "AcUpz2e1YbQtkOkM1BHG",  # único query multi-chain
 }
 
+# Poll de Allium: backoff exponencial hasta un techo, mismo presupuesto (~120s) que antes
+ALLIUM_POLL_INITIAL_DELAY = 0.5
+ALLIUM_POLL_MAX_DELAY = 8.0
+ALLIUM_POLL_TIMEOUT = 120
+
 CACHE_DIR = pathlib.Path(".cache")
 CACHE_DIR.mkdir(exist_ok=True)
 
+# Sesión HTTP compartida: keep-alive para Arkham, CoinGecko y Allium
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=8, pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504], raise_on_status=False),
+))
+
 
 # ============================================================
 # Cache
@@ -90,7 +105,7 @@ def cache_get(symbol, start, end):
     if path.exists():
         try:
             log(f"[CACHE] Loading {path.name}")
-            return json.load(open(path))
+            return orjson.loads(path.read_bytes())
         except Exception:
             pass
     return None
@@ -99,8 +114,13 @@ def cache_get(symbol, start, end):
 def cache_set(symbol, start, end, data):
     key = hashlib.sha1(f"{symbol}-{start}-{end}".encode()).hexdigest()
     path = CACHE_DIR / f"{symbol}_{key}.json"
-    with open(path, "w") as f:
-        json.dump(data, f, indent=2, default=str)
+    # Datetimes pass through to default=str, so they are stored as before
+    path.write_bytes(orjson.dumps(
+        data,
+        default=str,
+        option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        | orjson.OPT_PASSTHROUGH_DATETIME,
+    ))
     log(f"[CACHE] Saved {path.name}")
 
 
@@ -122,8 +142,6 @@ def fetch_arkham_flows(symbol, start_date=None, end_date=None):
     """
     Fetch Arkham flows (tries both api.arkm.com and intel.arkm.com for Intel users)
     """
-    import json, requests
-
     api_key = os.getenv("ARKHAM_API_KEY")
     if not api_key:
         log("[ARKHAM] ❌ Missing ARKHAM_API_KEY")
@@ -139,7 +157,7 @@ def fetch_arkham_flows(symbol, start_date=None, end_date=None):
     for url in candidates:
         try:
             log(f"[ARKHAM] 🔎 Trying {url}")
-            resp = requests.get(url, headers=headers, params=params, timeout=20)
+            resp = SESSION.get(url, headers=headers, params=params, timeout=20)
 
             if resp.status_code == 404 or resp.status_code == 401:
                 log(f"[ARKHAM] {url} → {resp.status_code}")
@@ -178,7 +196,7 @@ def fetch_coingecko_market(symbol):
         headers = {"accept": "application/json"}
         if api_key:
             headers["x-cg-pro-api-key"] = api_key
-        resp = requests.get(url, headers=headers, timeout=20)
+        resp = SESSION.get(url, headers=headers, timeout=20)
         if resp.status_code != 200:
             return {}
         j = resp.json().get("market_data", {})
@@ -225,7 +243,7 @@ def fetch_allium_staking(symbol: str, start_date: str, end_date: str):
             "run_config": {"limit": 10000},
         }
 
-        run_resp = requests.post(run_url, headers=headers, json=payload, timeout=60)
+        run_resp = SESSION.post(run_url, headers=headers, json=payload, timeout=60)
         run_resp.raise_for_status()
         run_id = run_resp.json().get("id") or run_resp.json().get("run_id")
 
@@ -235,17 +253,26 @@ def fetch_allium_staking(symbol: str, start_date: str, end_date: str):
 
         # 🔁 Poll de estado
         poll_url = f"{base_url}/query-runs/{run_id}"
-        for _ in range(60):
-            poll = requests.get(poll_url, headers=headers, timeout=30).json()
+        delay = ALLIUM_POLL_INITIAL_DELAY
+        deadline = time.monotonic() + ALLIUM_POLL_TIMEOUT
+        while (remaining := deadline - time.monotonic()) > 0:
+            poll_resp = SESSION.get(poll_url, headers=headers, timeout=30)
+            poll = poll_resp.json()
             status = poll.get("status", "").lower()
             if status in ("success", "completed", "done"):
                 break
             elif status in ("failed", "error"):
                 log(f"[ALLIUM] Query failed for {symbol}")
                 return []
-            time.sleep(2)
+            # Backoff exponencial; respeta Retry-After si Allium lo envía
+            try:
+                wait = max(float(poll_resp.headers.get("Retry-After", delay)), 0.0)
+            except (TypeError, ValueError):
+                wait = delay
+            time.sleep(min(wait, remaining))
+            delay = min(delay * 1.7, ALLIUM_POLL_MAX_DELAY)
 
-        results = requests.get(f"{poll_url}/results", headers=headers, timeout=60).json()
+        results = SESSION.get(f"{poll_url}/results", headers=headers, timeout=60).json()
         return results.get("data", [])
     except Exception as e:
         log(f"[ALLIUM] Error fetching {symbol}: {e}")
@@ -597,30 +624,25 @@ def fetch_staking_data(symbol, start_date, end_date):
 # Main (con soporte --format y fallback seguro)
 # ============================================================
 
-def main():
-    parser = argparse.ArgumentParser(description="MarketBrain Allium-based staking analysis")
-    parser.add_argument("--chains", nargs="+", required=True, help="Chains to analyze (ETH, SOL, etc.)")
-    parser.add_argument("--from", dest="start_date", required=True, help="Start date (YYYY-MM-DD)")
-    parser.add_argument("--to", dest="end_date", required=True, help="End date (YYYY-MM-DD)")
-    parser.add_argument("--no-cache", action="store_true", help="Disable local cache")
-    parser.add_argument("--no-insights", action="store_true", help="Skip GPT insights")
-    parser.add_argument("--format", choices=["json", "csv"], default="json", help="Output format (json or csv)")
-    args = parser.parse_args()
+def run(chains, start_date, end_date, use_cache=True, no_insights=False):
+    """Analyze each chain and return the MarketBrain output dict (what --format json prints).
 
+    Importable entry point, so exporters can skip spawning this script.
+    """
     load_dotenv()
 
     # ============================================================
     # 🔹 Procesar cada chain individualmente con tolerancia a errores
     # ============================================================
     results = {}
-    for sym in args.chains:
+    for sym in chains:
         try:
             results[sym] = fetch_chain_data(
                 sym,
-                args.start_date,
-                args.end_date,
-                use_cache=not args.no_cache,
-                no_insights=args.no_insights
+                start_date,
+                end_date,
+                use_cache=use_cache,
+                no_insights=no_insights
             )
         except Exception as e:
             log(f"[ERROR] Failed to process {sym}: {e}")
@@ -636,13 +658,30 @@ def main():
     # ============================================================
     # ✅ Construcción del resultado final
     # ============================================================
-    output = {
+    return {
         "type": "marketbrain",
         "timestamp": datetime.now(timezone.utc).isoformat(),
         "results": results,
         "source": "MarketBrain-Ultimate",
     }
 
+
+def main():
+    parser = argparse.ArgumentParser(description="MarketBrain Allium-based staking analysis")
+    parser.add_argument("--chains", nargs="+", required=True, help="Chains to analyze (ETH, SOL, etc.)")
+    parser.add_argument("--from", dest="start_date", required=True, help="Start date (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end_date", required=True, help="End date (YYYY-MM-DD)")
+    parser.add_argument("--no-cache", action="store_true", help="Disable local cache")
+    parser.add_argument("--no-insights", action="store_true", help="Skip GPT insights")
+    parser.add_argument("--format", choices=["json", "csv"], default="json", help="Output format (json or csv)")
+    args = parser.parse_args()
+
+    output = run(
+        args.chains, args.start_date, args.end_date,
+        use_cache=not args.no_cache, no_insights=args.no_insights
+    )
+    results = output["results"]
+
     # ============================================================
     # 🔸 Salida según formato solicitado
     # ============================================================